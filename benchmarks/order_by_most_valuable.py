@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import bs4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BADGE_ROW = ('<div class="badge_title_row">'
+             '<a class="badge_title_playgame" href="steam://run/{game_id}">Play</a>'
+             '<div class="badge_title">\t\t\t\t\t\t\t\t\t{game_name}\t\t\t\t\t\t\t\t\t&nbsp;</div>'
+             '<span class="progress_info_bold">{card_count} card drops remaining</span>'
+             '</div>')
+
+PRICE_ROW = ('<tr><td><a href="index.php?gamepage-appid-{game_id}">{game_name}</a></td>'
+             '<td>{card_count}</td><td>${price:.2f}</td></tr>')
+
+
+def build_price_table(rows):
+    table = ['<table><tr><th>Name</th><th>Cards</th><th>Price</th></tr>']
+
+    for game_id in range(rows):
+        table.append(PRICE_ROW.format(game_id=game_id,
+                                      game_name='Game {}'.format(game_id),
+                                      card_count=random.randint(5, 15),
+                                      price=random.uniform(0.1, 20)))
+
+    table.append('</table>')
+
+    return bs4.BeautifulSoup(''.join(table), 'html.parser')
+
+
+def build_badges(count, rows):
+    badges = []
+
+    for game_id in random.sample(range(rows), count):
+        badges.append(BADGE_ROW.format(game_id=game_id,
+                                       game_name='Game {}'.format(game_id),
+                                       card_count=random.randint(1, 5)))
+
+    html = bs4.BeautifulSoup(''.join(badges), 'html.parser')
+
+    return html.findAll('div', class_='badge_title_row')
+
+
+if __name__ == "__main__":
+    command_parser = argparse.ArgumentParser(description='Benchmark card_farming.order_by_most_valuable')
+    command_parser.add_argument('--badges', type=int, default=2000, help='Number of badges to order')
+    command_parser.add_argument('--rows', type=int, default=30000, help='Number of rows in the price table')
+    command_params = command_parser.parse_args()
+
+    # Without arguments stlib starts in gui mode
+    sys.argv = [sys.argv[0], '--benchmark']
+
+    import stlib
+
+    random.seed(0)
+    price_table = build_price_table(command_params.rows)
+    badges = build_badges(command_params.badges, command_params.rows)
+
+    start_time = time.perf_counter()
+    cards_info = stlib.card_farming.parse_cards_info(price_table)
+    index_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    stlib.card_farming.order_by_most_valuable(cards_info, badges)
+    order_time = time.perf_counter() - start_time
+
+    stlib.logging.console_msg('Price table rows: {}'.format(command_params.rows))
+    stlib.logging.console_msg('Badges: {}'.format(command_params.badges))
+    stlib.logging.console_msg('Index build: {:.3f}s'.format(index_time))
+    stlib.logging.console_msg('Ordering: {:.3f}s'.format(order_time))
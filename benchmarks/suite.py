@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+# Offline benchmarks. All requests made by stlib are sent to the
+# mock server (steam-tools.py --mock-server) through STEAM_TOOLS_BASE_URL.
+#
+# Usage:
+#   suite.py [--latency 0.05] [--output results.json] [--compare old.json]
+
+import argparse
+import configparser
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+STEAM_TOOLS_PATH = os.path.join(os.path.dirname(BENCHMARKS_PATH), 'steam-tools.py')
+RESULTS_PATH = os.path.join(BENCHMARKS_PATH, 'results')
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS_PATH))
+
+# The same user used by the mock server
+USER = 'mockuser'
+TRADE_IDS = ['{:05d}'.format(trade_id) for trade_id in range(10)]
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BENCHMARKS_PATH,
+                                       stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def start_server():
+    server = subprocess.Popen([sys.executable, STEAM_TOOLS_PATH, '--mock-server'], stdout=subprocess.PIPE)
+
+    for line in server.stdout:
+        line = line.decode('utf-8').strip()
+
+        if line.startswith('Mock server listening on '):
+            return server, line.rsplit(' ', 1)[1]
+
+    raise RuntimeError('Unable to start the mock server')
+
+
+def write_config(config_dir, params):
+    os.makedirs(os.path.join(config_dir, 'steam-tools'))
+
+    # Used by the mock server, which runs as steam-tools.py
+    server_config = configparser.RawConfigParser()
+    server_config.optionxform = str
+    server_config['MockServer'] = {'port': '0',
+                                   'latency': str(params.latency),
+                                   'latencyJitter': '0',
+                                   'badges': str(params.badges),
+                                   'priceRows': str(params.price_rows),
+                                   'giveawayPages': str(params.giveaway_pages)}
+
+    with open(os.path.join(config_dir, 'steam-tools', 'steam-tools.config'), 'w') as config_file:
+        server_config.write(config_file)
+
+    config_parser = configparser.RawConfigParser()
+    config_parser.optionxform = str
+
+    config_parser['Debug'] = {'consoleLevel': 'error', 'metricsSnapshot': 'false'}
+    config_parser['Network'] = {'hostRateLimit': str(params.host_rate_limit)}
+    config_parser['CardFarming'] = {}
+    config_parser['SteamGifts'] = {'maxPages': str(params.giveaway_pages), 'maxEntriesPerMinute': '0'}
+    config_parser['SteamTrades'] = {'verifyBumps': 'true'}
+
+    for service_name in ['steam', 'steamgifts', 'steamtrades']:
+        config_parser[service_name + 'Cookies'] = {'sessionid': 'benchmark'}
+
+    config_file_name = os.path.splitext(os.path.basename(sys.argv[0]))[0] + '.config'
+
+    with open(os.path.join(config_dir, 'steam-tools', config_file_name), 'w') as config_file:
+        config_parser.write(config_file)
+
+
+def get_request_count():
+    try:
+        return sum(stlib.metrics.metrics['requests_total'][1].values())
+    except KeyError:
+        return 0
+
+
+def measure(function, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+
+    return {'best': min(timings), 'mean': sum(timings) / repeat, 'repeat': repeat}
+
+
+def run_scenario(function):
+    requests_before = get_request_count()
+    start_time = time.perf_counter()
+    result = function()
+    elapsed_time = time.perf_counter() - start_time
+    result.update(seconds=elapsed_time, requests=get_request_count() - requests_before)
+
+    return result
+
+
+def clear_badges_cache():
+    stlib.cache.execute('DELETE FROM badge_pages')
+    stlib.cache.execute('DELETE FROM badges')
+    stlib.cache.execute('DELETE FROM blobs')
+    stlib.card_farming.badge_pages.clear()
+
+
+def prepare_card_farming():
+    badges = stlib.card_farming.get_all_badges()
+    badges = stlib.card_farming.remove_completed_badges(badges)
+    cards_info = stlib.card_farming.get_cards_info()
+    badges = stlib.card_farming.order_by_most_valuable(cards_info, badges)
+
+    return {'badges': len(badges)}
+
+
+def poll_card_farming():
+    badges = stlib.card_farming.remove_completed_badges(stlib.card_farming.get_all_badges())
+    card_counts = stlib.card_farming.update_card_counts(badges[:6])
+
+    return {'badges': len(card_counts)}
+
+
+def join_giveaways():
+    stlib.steamgifts_join.entered_giveaways = None
+    stlib.steamgifts_join.invalidate_points()
+
+    html, giveaways = stlib.steamgifts_join.get_candidates(['wishlist', 'main', 'new'])
+    points = stlib.steamgifts_join.seed_points(html)
+    plan = stlib.steamgifts_join.plan_giveaways(giveaways, points)
+    entered = 0
+
+    for giveaway, post_data in stlib.steamgifts_join.get_giveaway_forms(plan):
+        if stlib.steamgifts_join.enter_giveaway(giveaway, post_data):
+            entered += 1
+
+    return {'candidates': len(giveaways), 'planned': len(plan), 'entered': entered}
+
+
+def bump_trades():
+    stlib.steamtrades_bump.schedule_trades(TRADE_IDS)
+    bumped_trades = stlib.steamtrades_bump.bump_due_trades(3600, 4000)
+
+    return {'trades': len(TRADE_IDS), 'bumped': len(bumped_trades)}
+
+
+def run_end_to_end():
+    results = {}
+    config_parser = stlib.config.read()
+
+    clear_badges_cache()
+    results['card_farming_cold'] = run_scenario(prepare_card_farming)
+
+    # Every page is still valid, but must be revalidated with the server
+    config_parser['CardFarming'].update(badgeCacheTTL='-1', priceCacheTTL='-1')
+    stlib.card_farming.badge_pages.clear()
+    results['card_farming_revalidated'] = run_scenario(prepare_card_farming)
+
+    config_parser['CardFarming'].update(badgeCacheTTL='3600', priceCacheTTL='86400')
+    stlib.card_farming.badge_pages.clear()
+    results['card_farming_cached'] = run_scenario(prepare_card_farming)
+
+    results['card_farming_poll'] = run_scenario(poll_card_farming)
+    results['steamgifts_join_pass'] = run_scenario(join_giveaways)
+    results['steamtrades_bump_cycle'] = run_scenario(bump_trades)
+    # All trades were bumped just now, so the server asks to wait
+    results['steamtrades_bump_cycle_waiting'] = run_scenario(bump_trades)
+
+    return results
+
+
+def fetch(url, service_name='steam'):
+    # Sent like the app does, with the cookies of the service
+    if service_name:
+        return stlib.network.try_get_response(service_name, url)
+
+    return stlib.network.get_response(url)
+
+
+def run_micro(repeat):
+    results = {}
+    profile = stlib.steam_profile()
+    extractor = stlib.extractor
+    card_farming = stlib.card_farming
+    steamgifts_join = stlib.steamgifts_join
+
+    badges_page = fetch('{}/badges/'.format(profile)).content
+    badges = extractor.parse(badges_page, 'badges').findAll('div', class_='badge_title_row')
+    results['extractor.parse.badges'] = measure(lambda: extractor.parse(badges_page, 'badges'), repeat)
+    results['card_farming.get_game_id'] = measure(lambda: [card_farming.get_game_id(badge) for badge in badges],
+                                                  repeat)
+    results['card_farming.get_game_name'] = measure(lambda: [card_farming.get_game_name(badge) for badge in badges],
+                                                    repeat)
+    results['card_farming.get_card_count'] = measure(lambda: [card_farming.get_card_count(badge)
+                                                              for badge in badges], repeat)
+
+    game_id = card_farming.get_game_id(badges[0])
+    gamecards_page = fetch('{}/gamecards/{}'.format(profile, game_id)).content
+    results['extractor.extract.gamecards'] = measure(lambda: extractor.extract(gamecards_page, 'gamecards'), repeat)
+
+    prices_page = fetch(stlib.badge_prices_page, None).content
+    prices_html = extractor.parse(prices_page, 'badge_prices')
+    cards_columns = card_farming.parse_cards_columns(prices_html)
+    cards_data = card_farming.dump_cards_columns(cards_columns)
+    cards_info = card_farming.index_cards_info(cards_columns)
+    results['extractor.parse.badge_prices'] = measure(lambda: extractor.parse(prices_page, 'badge_prices'), repeat)
+    results['card_farming.parse_cards_columns'] = measure(lambda: card_farming.parse_cards_columns(prices_html),
+                                                          repeat)
+    results['card_farming.index_cards_info'] = measure(lambda: card_farming.index_cards_info(cards_columns), repeat)
+    results['card_farming.load_cards_columns'] = measure(lambda: card_farming.load_cards_columns(cards_data), repeat)
+    results['card_farming.order_by_most_valuable'] = measure(lambda: card_farming.order_by_most_valuable(cards_info,
+                                                                                                         badges),
+                                                             repeat)
+
+    giveaways_page = fetch(steamgifts_join.get_query_url('main'), 'steamgifts').content
+    giveaways_html = extractor.parse(giveaways_page, 'giveaways')
+    giveaways = list(steamgifts_join.get_giveaways(giveaways_html))
+    results['extractor.parse.giveaways'] = measure(lambda: extractor.parse(giveaways_page, 'giveaways'), repeat)
+    results['steamgifts_join.get_giveaways'] = measure(lambda: list(steamgifts_join.get_giveaways(giveaways_html)),
+                                                       repeat)
+
+    for function_name in ['get_giveaway_code',
+                          'get_giveaway_points',
+                          'get_giveaway_copies',
+                          'get_giveaway_entries',
+                          'get_giveaway_level',
+                          'get_giveaway_value']:
+        function = getattr(steamgifts_join, function_name)
+        results['steamgifts_join.' + function_name] = measure(lambda: [function(giveaway) for giveaway in giveaways],
+                                                              repeat)
+
+    results['steamgifts_join.plan_giveaways'] = measure(lambda: steamgifts_join.plan_giveaways(giveaways, 400),
+                                                        repeat)
+
+    giveaway_url = stlib.steamgifts_url + steamgifts_join.get_giveaway_query(giveaways[0])
+    giveaway_page = fetch(giveaway_url, 'steamgifts').content
+    results['extractor.parse.giveaway'] = measure(lambda: extractor.parse(giveaway_page, 'giveaway'), repeat)
+
+    points_page = fetch(stlib.steamgifts_check_page, 'steamgifts').content
+    results['extractor.extract.steamgifts'] = measure(lambda: extractor.extract(points_page, 'steamgifts'), repeat)
+
+    trade_page = fetch('{}{}/'.format(stlib.steamtrades_trade_page, TRADE_IDS[0]), 'steamtrades').content
+    results['extractor.parse.trade'] = measure(lambda: extractor.parse(trade_page, 'trade'), repeat)
+
+    for service_name in ['steam', 'steamgifts', 'steamtrades']:
+        response = fetch(getattr(stlib, service_name + '_check_page'), service_name)
+        function = getattr(stlib.logins, 'get_{}_user'.format(service_name))
+        results['logins.get_{}_user'.format(service_name)] = measure(lambda: function(response), repeat)
+
+    return results
+
+
+def compare(results, old_results):
+    stlib.logging.console_msg('{:45s} {:>10s} {:>10s} {:>8s}'.format('benchmark', 'old', 'new', 'change'))
+
+    for group, key in [('end_to_end', 'seconds'), ('micro', 'best')]:
+        for name, result in sorted(results[group].items()):
+            try:
+                old_value = old_results[group][name][key]
+            except KeyError:
+                continue
+
+            stlib.logging.console_msg('{:45s} {:10.4f} {:10.4f} {:+7.1f}%'.format(name,
+                                                                               old_value,
+                                                                               result[key],
+                                                                               (result[key] / old_value - 1) * 100))
+
+
+if __name__ == "__main__":
+    command_parser = argparse.ArgumentParser(description='Offline benchmarks with the mock server')
+    command_parser.add_argument('--latency', type=float, default=0.05, help='Seconds the server waits per request')
+    command_parser.add_argument('--badges', type=int, default=750, help='Number of badges')
+    command_parser.add_argument('--price-rows', type=int, default=30000, help='Number of rows in the price table')
+    command_parser.add_argument('--giveaway-pages', type=int, default=3, help='Number of giveaway pages')
+    command_parser.add_argument('--host-rate-limit', type=float, default=0, help='[Network] hostRateLimit')
+    command_parser.add_argument('--repeat', type=int, default=5, help='Runs of each micro benchmark')
+    command_parser.add_argument('--output', help='Results file (default: benchmarks/results/<commit>.json)')
+    command_parser.add_argument('--compare', help='Results file to compare with')
+    command_params = command_parser.parse_args()
+
+    # Never touch the real config and cache
+    config_dir = tempfile.mkdtemp(prefix='steam-tools-benchmark-')
+    os.environ['XDG_CONFIG_HOME'] = config_dir
+    os.environ['LOCALAPPDATA'] = config_dir
+    write_config(config_dir, command_params)
+
+    server, base_url = start_server()
+    os.environ['STEAM_TOOLS_BASE_URL'] = base_url
+
+    # Without arguments stlib starts in gui mode
+    sys.argv = [sys.argv[0], '--benchmark']
+
+    import stlib
+
+    try:
+        stlib.steam_user = USER
+        stlib.SG_user = USER
+        stlib.ST_user = USER
+
+        commit = get_commit()
+        results = {'commit': commit,
+                   'date': datetime.datetime.now().isoformat(),
+                   'python': platform.python_version(),
+                   'html_parser': stlib.extractor.HTML_PARSER,
+                   'selectolax': bool(stlib.extractor.HTMLParser),
+                   'params': vars(command_params),
+                   'end_to_end': run_end_to_end(),
+                   'micro': run_micro(command_params.repeat)}
+    finally:
+        server.terminate()
+        server.wait()
+
+    for name, result in sorted(results['end_to_end'].items()):
+        details = ', '.join('{}: {}'.format(key, value) for key, value in sorted(result.items()) if key != 'seconds')
+        stlib.logging.console_msg('{:45s} {:8.3f}s ({})'.format(name, result['seconds'], details))
+
+    for name, result in sorted(results['micro'].items()):
+        stlib.logging.console_msg('{:45s} {:8.2f}ms'.format(name, result['best'] * 1000))
+
+    output_path = command_params.output or os.path.join(RESULTS_PATH, '{}.json'.format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    with open(output_path, 'w') as output_file:
+        json.dump(results, output_file, indent=4, sort_keys=True)
+
+    stlib.logging.console_msg('Results written to {}'.format(output_path))
+
+    if command_params.compare:
+        with open(command_params.compare) as compare_file:
+            compare(results, json.load(compare_file))
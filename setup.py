@@ -79,6 +79,12 @@ data_files.append(('ui', [os.path.join('ui', 'interface.xml'),
                           os.path.join('ui', 'interface.css'),
                           os.path.join('ui', 'menu.xml')]))
 
+# Include the mock server pages. Other builds have them in package_data
+if os.name == 'nt':
+    fixtures_path = os.path.join('stlib', 'mock_fixtures')
+    for fixture in os.listdir(fixtures_path):
+        data_files.append((fixtures_path, [os.path.join(fixtures_path, fixture)]))
+
 # Include icons
 icons_path = os.path.join('ui', 'icons')
 for icon in os.listdir(icons_path):
@@ -228,6 +234,8 @@ setup(
         packages=['stlib',
                   'ui'],
 
+        package_data={'stlib': [os.path.join('mock_fixtures', '*')]},
+
         cmdclass={'install_scripts': CheckExtension},
 
         requires=['pygobject',
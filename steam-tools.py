@@ -48,14 +48,27 @@ if __name__ == "__main__":
                                 nargs=1,
                                 help='Start module without GUI (console mode)',
                                 dest='module')
+    command_parser.add_argument('--profile',
+                                action='store_true',
+                                help='Sample where the time is spent and show a summary on exit',
+                                dest='profile')
+    command_parser.add_argument('--mock-server',
+                                action='store_true',
+                                help='Run a local stand-in for Steam, SteamGifts and SteamTrades',
+                                dest='mock_server')
     command_parser.add_argument('options',
                                 nargs='*',
                                 help=argparse.SUPPRESS)
 
     command_params = command_parser.parse_args()
 
+    if command_params.profile:
+        stlib.profiler.start()
+
     try:
-        if command_params.module:
+        if command_params.mock_server:
+            stlib.mock_server.run()
+        elif command_params.module:
             if os.name is 'nt' and os.getenv('PWD'):
                 stlib.logger.warning('Running steam tools from custom console is not supported on Windows.')
                 stlib.logger.warning('Some problems may occur.')
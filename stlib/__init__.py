@@ -1,13 +1,17 @@
 #  Keep the import order, please
 
 import atexit
+import os
 import sys
 
 import gevent.monkey
 
 gevent.monkey.patch_all()
 
-if len(sys.argv) == 1:
+# Options that can be used without leaving the gui mode
+GUI_OPTIONS = ['--profile']
+
+if not [arg for arg in sys.argv[1:] if arg not in GUI_OPTIONS]:
     gui_mode = True
 else:
     gui_mode = False
@@ -15,6 +19,10 @@ else:
 # noinspection PyPep8
 from stlib import (logging,
                    config,
+                   cache,
+                   metrics,
+                   profiler,
+                   extractor,
                    network,
                    browser,
                    libsteam,
@@ -22,10 +30,15 @@ from stlib import (logging,
                    card_farming,
                    steamtrades_bump,
                    steamgifts_join,
-                   authenticator)
+                   authenticator,
+                   mock_server)
 
 __all__ = ['logging',
            'config',
+           'cache',
+           'metrics',
+           'profiler',
+           'extractor',
            'network',
            'browser',
            'libsteam',
@@ -33,30 +46,61 @@ __all__ = ['logging',
            'card_farming',
            'steamtrades_bump',
            'steamgifts_join',
-           'authenticator']
+           'authenticator',
+           'mock_server']
 
 logger = logging.get_logger()
 wrapper_process = None
+wrapper_processes = {}
 
 
 def __safe_exit():
     logging.console_fixer()
     logger.warning('Exiting...')
+    network.close_sessions()
+    metrics.write_snapshot()
+    cache.close()
+    config.flush()
+
+    return_ = 0
+
+    if wrapper_processes:
+        return_ = libsteam.stop_wrapper()
 
-    if wrapper_process:
-        return libsteam.stop_wrapper()
+    libsteam.stop_supervisor()
+
+    return return_
 
 
 atexit.register(__safe_exit)
 
+
+def __get_base_url(name, default):
+    # e.g.: STEAM_TOOLS_STEAMGIFTS_URL or [Network] steamgiftsUrl. The base url of
+    # all services (STEAM_TOOLS_BASE_URL or [Network] baseUrl) is for the mock server
+    base_url = os.getenv('STEAM_TOOLS_{}_URL'.format(name.upper()), config.get('Network', name + 'Url'))
+
+    if not base_url:
+        base_url = os.getenv('STEAM_TOOLS_BASE_URL', config.get('Network', 'baseUrl', fallback=default))
+
+    return base_url.rstrip('/')
+
+
 api_query_uri = 'http://query.lara.click'
-steam_login_page = 'https://steamcommunity.com/login/checkstoredlogin'
+steamcommunity_url = __get_base_url('steamcommunity', 'https://steamcommunity.com')
+steamapi_url = __get_base_url('steamapi', 'https://api.steampowered.com')
+steamcardexchange_url = __get_base_url('steamcardexchange', 'http://www.steamcardexchange.net')
+steamgifts_url = __get_base_url('steamgifts', 'https://www.steamgifts.com')
+steamtrades_url = __get_base_url('steamtrades', 'https://www.steamtrades.com')
+steamcompanion_url = __get_base_url('steamcompanion', 'https://steamcompanion.com')
+steam_login_page = '{}/login/checkstoredlogin'.format(steamcommunity_url)
 steam_check_page = '{}/?redirectURL=discussions'.format(steam_login_page)
-steamgifts_check_page = 'https://www.steamgifts.com/account/profile/sync'
-steamgifts_query_page = 'https://www.steamgifts.com/giveaways/search'
-steamtrades_check_page = 'https://www.steamtrades.com/legal/privacy-policy'
-steamtrades_trade_page = 'https://www.steamtrades.com/trade/'
-steamcompanion_check_page = 'https://steamcompanion.com/settings'
+badge_prices_page = '{}/index.php?badgeprices'.format(steamcardexchange_url)
+steamgifts_check_page = '{}/account/profile/sync'.format(steamgifts_url)
+steamgifts_query_page = '{}/giveaways/search'.format(steamgifts_url)
+steamtrades_check_page = '{}/legal/privacy-policy'.format(steamtrades_url)
+steamtrades_trade_page = '{}/trade/'.format(steamtrades_url)
+steamcompanion_check_page = '{}/settings'.format(steamcompanion_url)
 SA_adb_path = 'platform-tools/adb.exe'
 SA_auth_path = '/data/data/com.valvesoftware.android.steam.community/'
 
@@ -78,7 +78,7 @@ def __get_data_from_authenticator(path):
 
 
 def __get_server_time():
-    query_time_url = 'https://api.steampowered.com/ITwoFactorService/QueryTime/v1'
+    query_time_url = '{}/ITwoFactorService/QueryTime/v1'.format(stlib.steamapi_url)
 
     for i in range(2):
         response = stlib.network.get_response(query_time_url, empty_post=True)
@@ -186,7 +186,7 @@ def get_trades(secret, cookies):
                'm':'android',
                'tag':'conf'}
 
-    response = requests.get('https://steamcommunity.com/mobileconf/conf',
+    response = requests.get('{}/mobileconf/conf'.format(stlib.steamcommunity_url),
                             params=payload,
                             cookies=cookies)
 
@@ -216,7 +216,7 @@ def finalize_trade(cookies, secret, trade_id, trade_key, do='cancel'):
                'ck':trade_key,
                'op':do}
 
-    response = requests.get('https://steamcommunity.com/mobileconf/ajaxop',
+    response = requests.get('{}/mobileconf/ajaxop'.format(stlib.steamcommunity_url),
                             params=payload,
                             cookies=cookies)
 
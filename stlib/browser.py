@@ -18,9 +18,8 @@
 
 import json
 import os
-import shutil
 import sqlite3
-import tempfile
+import urllib.request
 
 import stlib
 
@@ -40,6 +39,20 @@ else:
         ]
 
 
+aes_key = None
+# Decrypted cookies by database path: (mtime, host keys, {host key: {name: value}})
+cookies_cache = {}
+
+
+def __get_aes_key():
+    global aes_key
+
+    if not aes_key:
+        aes_key = PBKDF2(b'peanuts', b'saltysalt', 16, 1)
+
+    return aes_key
+
+
 def __decrypt_data(encrypted_data):
     if os.name == 'nt':
         # Thanks to Crusher Joe (crusherjoe <at> eudoramail.com)
@@ -56,39 +69,71 @@ def __decrypt_data(encrypted_data):
 
         return buffer.raw.decode(locale.getpreferredencoding())
     else:
-        cipher = AES.new(PBKDF2(b'peanuts', b'saltysalt', 16, 1), AES.MODE_CBC, IV=b' ' * 16)
+        cipher = AES.new(__get_aes_key(), AES.MODE_CBC, IV=b' ' * 16)
         decrypted = cipher.decrypt(encrypted_data[3:])
 
         return decrypted[:-decrypted[-1]].decode('utf-8')
 
 
+def __connect_cookies_database(cookies_path):
+    uri = 'file:' + urllib.request.pathname2url(os.path.abspath(cookies_path))
+
+    try:
+        connection = sqlite3.connect(uri + '?mode=ro', uri=True)
+        connection.execute('SELECT 1 FROM cookies LIMIT 1')
+    except sqlite3.OperationalError:
+        # The browser is running and holding an exclusive lock
+        connection = sqlite3.connect(uri + '?immutable=1', uri=True)
+
+    return connection
+
+
+def __read_cookies(cookies_path, host_keys):
+    cookies = dict((host_key, {}) for host_key in host_keys)
+    connection = __connect_cookies_database(cookies_path)
+    query = 'SELECT host_key, name, value, encrypted_value FROM cookies WHERE host_key IN ({})'
+
+    try:
+        for host_key, key, data, encrypted_data in connection.execute(query.format(', '.join('?' * len(host_keys))),
+                                                                      list(host_keys)):
+            if key == '_ga':
+                continue
+
+            if encrypted_data[:3] != b'v10' and encrypted_data[:3] != b'\x01\x00\x00':
+                if data:
+                    cookies[host_key][key] = data
+                else:
+                    cookies[host_key][key] = encrypted_data
+            else:
+                cookies[host_key][key] = __decrypt_data(encrypted_data)
+    finally:
+        connection.close()
+
+    return cookies
+
+
+@stlib.profiler.timed('browser.get_cookies')
 def get_cookies(url):
-    cookies = {}
-    temp_dir = tempfile.mkdtemp()
     config_parser = stlib.config.read()
     profile = config_parser.get('Config', 'browserProfile')
     cookies_path = os.path.join(get_chrome_dir(), profile, 'Cookies')
-    temp_cookies_path = os.path.join(temp_dir, os.path.basename(cookies_path))
-    shutil.copy(cookies_path, temp_cookies_path)
-
-    connection = sqlite3.connect(temp_cookies_path)
-    query = 'SELECT name, value, encrypted_value FROM cookies WHERE host_key LIKE ?'
-    for key, data, encrypted_data in connection.execute(query, (get_domain_name(url),)):
-        if key == '_ga':
-            continue
-
-        if encrypted_data[:3] != b'v10' and encrypted_data[:3] != b'\x01\x00\x00':
-            if data:
-                cookies[key] = data
-            else:
-                cookies[key] = encrypted_data
-        else:
-            cookies[key] = __decrypt_data(encrypted_data)
-    connection.close()
+    domain_name = get_domain_name(url)
+    mtime = os.path.getmtime(cookies_path)
+
+    try:
+        cached_mtime, host_keys, cookies = cookies_cache[cookies_path]
+    except KeyError:
+        cached_mtime, host_keys, cookies = None, frozenset(), {}
 
-    shutil.rmtree(temp_dir)
+    if cached_mtime != mtime or domain_name not in host_keys:
+        # All services are read at once, they are usually recovered together
+        host_keys = host_keys.union([domain_name],
+                                    [get_domain_name(getattr(stlib, service_name + '_check_page'))
+                                     for service_name in stlib.network.SERVICES])
+        cookies = __read_cookies(cookies_path, host_keys)
+        cookies_cache[cookies_path] = (mtime, host_keys, cookies)
 
-    return cookies
+    return dict(cookies[domain_name])
 
 
 def get_chrome_dir():
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+
+import os
+import sqlite3
+import time
+
+import gevent.monkey
+
+# NEVER import full stlib module here!!! (cyclic)
+from stlib import config as stconfig
+
+cache_file_path = os.path.join(os.path.dirname(stconfig.config_file_path), 'cache.sqlite')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS badge_pages (
+           user TEXT,
+           page INTEGER,
+           etag TEXT,
+           last_modified TEXT,
+           last_checked REAL,
+           PRIMARY KEY (user, page))''',
+    '''CREATE TABLE IF NOT EXISTS badges (
+           user TEXT,
+           page INTEGER,
+           position INTEGER,
+           game_id TEXT,
+           game_name TEXT,
+           card_count INTEGER,
+           html TEXT,
+           last_checked REAL,
+           PRIMARY KEY (user, page, position))''',
+    '''CREATE TABLE IF NOT EXISTS blobs (
+           name TEXT PRIMARY KEY,
+           etag TEXT,
+           last_modified TEXT,
+           last_checked REAL,
+           data BLOB)''',
+    '''CREATE TABLE IF NOT EXISTS entered_giveaways (
+           user TEXT,
+           code TEXT,
+           entered REAL,
+           PRIMARY KEY (user, code))''',
+    '''CREATE TABLE IF NOT EXISTS logins (
+           service TEXT PRIMARY KEY,
+           fingerprint TEXT,
+           user TEXT,
+           last_checked REAL)''',
+]
+
+connection = None
+# The cache is shared with the workers, which are real threads
+lock = gevent.monkey.get_original('threading', 'Lock')()
+
+
+def get_connection():
+    global connection
+
+    if not connection:
+        connection = sqlite3.connect(cache_file_path, check_same_thread=False)
+
+        for statement in SCHEMA:
+            connection.execute(statement)
+
+        connection.commit()
+
+    return connection
+
+
+def execute(query, params=()):
+    with lock:
+        connection_ = get_connection()
+        rows = connection_.execute(query, params).fetchall()
+        connection_.commit()
+
+    return rows
+
+
+def executemany(query, params):
+    with lock:
+        connection_ = get_connection()
+        connection_.executemany(query, params)
+        connection_.commit()
+
+
+def close():
+    global connection
+
+    with lock:
+        if connection:
+            connection.close()
+            connection = None
+
+
+def get_badge_pages(user):
+    query = 'SELECT page, last_checked FROM badge_pages WHERE user = ? ORDER BY page'
+    return dict(execute(query, (user,)))
+
+
+def get_badge_page_validators(user, page):
+    query = 'SELECT etag, last_modified FROM badge_pages WHERE user = ? AND page = ?'
+    headers = {}
+
+    for etag, last_modified in execute(query, (user, page)):
+        if etag:
+            headers['If-None-Match'] = etag
+
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    return headers
+
+
+def touch_badge_page(user, page):
+    execute('UPDATE badge_pages SET last_checked = ? WHERE user = ? AND page = ?', (time.time(), user, page))
+
+
+def save_badge_page(user, page, etag, last_modified, badges):
+    now = time.time()
+
+    execute('INSERT OR REPLACE INTO badge_pages VALUES (?, ?, ?, ?, ?)', (user, page, etag, last_modified, now))
+    execute('DELETE FROM badges WHERE user = ? AND page = ?', (user, page))
+    executemany('INSERT INTO badges VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(user, page, position, game_id, game_name, card_count, html, now)
+                 for position, (game_id, game_name, card_count, html) in enumerate(badges)])
+
+
+def prune_badge_pages(user, page_count):
+    execute('DELETE FROM badge_pages WHERE user = ? AND page > ?', (user, page_count))
+    execute('DELETE FROM badges WHERE user = ? AND page > ?', (user, page_count))
+
+
+def get_badges(user, page):
+    query = 'SELECT html FROM badges WHERE user = ? AND page = ? AND card_count != 0 ORDER BY position'
+    return [html for html, in execute(query, (user, page))]
+
+
+def update_badge(user, game_id, card_count, html):
+    query = 'UPDATE badges SET card_count = ?, html = ?, last_checked = ? WHERE user = ? AND game_id = ?'
+    execute(query, (card_count, html, time.time(), user, game_id))
+
+
+def get_blob(name):
+    query = 'SELECT etag, last_modified, last_checked, data FROM blobs WHERE name = ?'
+
+    for etag, last_modified, last_checked, data in execute(query, (name,)):
+        return {'etag': etag, 'last_modified': last_modified, 'last_checked': last_checked, 'data': data}
+
+    return None
+
+
+def get_blob_validators(blob):
+    headers = {}
+
+    if blob and blob['etag']:
+        headers['If-None-Match'] = blob['etag']
+
+    if blob and blob['last_modified']:
+        headers['If-Modified-Since'] = blob['last_modified']
+
+    return headers
+
+
+def save_blob(name, etag, last_modified, data):
+    execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)',
+            (name, etag, last_modified, time.time(), sqlite3.Binary(data)))
+
+
+def touch_blob(name):
+    execute('UPDATE blobs SET last_checked = ? WHERE name = ?', (time.time(), name))
+
+
+def get_entered_giveaways(user):
+    return set(code for code, in execute('SELECT code FROM entered_giveaways WHERE user = ?', (user,)))
+
+
+def add_entered_giveaways(user, codes):
+    now = time.time()
+    executemany('INSERT OR REPLACE INTO entered_giveaways VALUES (?, ?, ?)', [(user, code, now) for code in codes])
+
+
+def prune_entered_giveaways(user, max_age):
+    execute('DELETE FROM entered_giveaways WHERE user = ? AND entered < ?', (user, time.time() - max_age))
+
+
+def get_login(service, fingerprint, max_age):
+    query = 'SELECT user FROM logins WHERE service = ? AND fingerprint = ? AND last_checked > ?'
+
+    for user, in execute(query, (service, fingerprint, time.time() - max_age)):
+        return user
+
+    return None
+
+
+def save_login(service, fingerprint, user):
+    execute('INSERT OR REPLACE INTO logins VALUES (?, ?, ?, ?)', (service, fingerprint, user, time.time()))
@@ -16,9 +16,22 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #
 
+import array
+import struct
+import time
+
 import stlib
 
+PRICES_BLOB = 'badge_prices.v1'
+
 current_badge = 0
+running_badges = []
+badge_pages = {}
+
+# Per game card drop history and the learned interval between drops
+drop_stats = {}
+drop_interval = None
+
 
 def remove_completed_badges(badges):
     stlib.logger.info('Ignoring already completed badges')
@@ -30,10 +43,12 @@ def remove_completed_badges(badges):
     return new_badges
 
 
-def get_badge_page_count():
+def get_badge_page_count(html=None):
     stlib.logger.info('Counting badge pages')
-    profile = stlib.steam_profile()
-    html = stlib.network.try_get_html('steam', '{}/badges/'.format(profile))
+
+    if not html:
+        profile = stlib.steam_profile()
+        html = stlib.network.try_get_html('steam', '{}/badges/'.format(profile), page_type='badges')
 
     try:
         page_count = int(html.findAll('a', class_='pagelink')[-1].text)
@@ -43,12 +58,99 @@ def get_badge_page_count():
     return page_count
 
 
-def get_badges(page):
+def __get_badges_page(page):
     stlib.logger.info('Getting badges from page %d', page)
     profile = stlib.steam_profile()
-    html = stlib.network.try_get_html('steam', '{}/badges/?p={}'.format(profile, page))
+    headers = stlib.cache.get_badge_page_validators(stlib.steam_user, page)
+    response = stlib.network.try_get_response('steam', '{}/badges/?p={}'.format(profile, page), headers=headers)
+
+    if not response:
+        stlib.logger.error('Unable to get badges from page %d', page)
+        return None, []
+
+    if response.status_code == 304:
+        stlib.logger.verbose('Badge page %d was not modified', page)
+        stlib.cache.touch_badge_page(stlib.steam_user, page)
+        return None, get_cached_badges(page)
+
+    html = stlib.extractor.parse(response.content, 'badges')
+    badges = html.findAll('div', class_='badge_title_row')
+    __remember_badge_pages(badges, page)
+
+    stlib.cache.save_badge_page(stlib.steam_user,
+                                page,
+                                response.headers.get('ETag'),
+                                response.headers.get('Last-Modified'),
+                                [(get_game_id(badge), get_game_name(badge), get_card_count(badge), str(badge))
+                                 for badge in badges])
+
+    return html, badges
+
+
+def get_badges(page):
+    return __get_badges_page(page)[1]
+
+
+def get_cached_badges(page):
+    stlib.logger.verbose('Getting cached badges from page %d', page)
+    html = stlib.extractor.parse(''.join(stlib.cache.get_badges(stlib.steam_user, page)), 'badges')
+    badges = html.findAll('div', class_='badge_title_row')
+    __remember_badge_pages(badges, page)
+
+    return badges
+
+
+def __remember_badge_pages(badges, page):
+    for badge in badges:
+        badge_pages[get_game_id(badge)] = page
+
+
+def get_all_badges():
+    config_parser = stlib.config.read()
+    concurrency = config_parser.getint('CardFarming', 'maxConcurrentPages', fallback=4)
+    cache_ttl = config_parser.getint('CardFarming', 'badgeCacheTTL', fallback=3600)
+
+    cached_pages = stlib.cache.get_badge_pages(stlib.steam_user)
+    stale_pages = [page for page, last_checked in cached_pages.items() if time.time() - last_checked > cache_ttl]
+
+    if cached_pages and not stale_pages:
+        stlib.logger.info('Using cached badges')
+        badges = []
+
+        for page in sorted(cached_pages):
+            badges.extend(get_cached_badges(page))
+
+        return badges
+
+    # The first page tell us how many pages exists, so it can't be concurrent
+    html, badges = __get_badges_page(1)
+
+    if html:
+        badge_pages = get_badge_page_count(html)
+        stlib.cache.prune_badge_pages(stlib.steam_user, badge_pages)
+    elif cached_pages:
+        badge_pages = max(cached_pages)
+
+        # Unable to get the first page. Use the cached one.
+        if not badges:
+            badges = get_cached_badges(1)
+    else:
+        return []
+
+    pages = range(2, badge_pages + 1)
+    outdated_pages = [page for page in pages if page not in cached_pages or page in stale_pages]
+    updated_pages = dict(zip(outdated_pages, stlib.network.map_async(__get_badges_page, outdated_pages, concurrency)))
+
+    for page in pages:
+        html, page_badges = updated_pages.get(page, (None, []))
+
+        # Pages not outdated or unable to get are read from the cache
+        if html or page_badges:
+            badges.extend(page_badges)
+        else:
+            badges.extend(get_cached_badges(page))
 
-    return html.findAll('div', class_='badge_title_row')
+    return badges
 
 
 def get_game_name(badge):
@@ -84,47 +186,328 @@ def get_card_count(badge, update_from_web=False):
     if update_from_web:
         stlib.logger.verbose('Updating number of cards of %s(%s)', game_name, game_id)
         profile = stlib.steam_profile()
-        html = stlib.network.try_get_html('steam', '{}/gamecards/{}'.format(profile, game_id))
-        stats = html.find('div', class_='badge_title_stats_drops')
-        progress = stats.find('span', class_='progress_info_bold')
+        response = stlib.network.try_get_response('steam', '{}/gamecards/{}'.format(profile, game_id))
+        fields = stlib.extractor.extract(response.content, 'gamecards') if response else {'stats': None}
+
+        if fields['stats'] is None:
+            stlib.logger.error('Unable to update number of cards of %s(%s)', game_name, game_id)
+            return get_card_count(badge)
+
+        progress = fields['card_drops']
     else:
         stlib.logger.verbose('Getting number of cards of %s(%s)', game_name, game_id)
         progress = badge.find('span', class_='progress_info_bold')
 
-    if not progress or 'No' in progress.text:
-        return 0
+        if progress:
+            progress = progress.text
+
+    if not progress or 'No' in progress:
+        card_count = 0
     else:
-        return int(progress.text.split(' ', 3)[0])
+        card_count = int(progress.split(' ', 3)[0])
+
+    if update_from_web:
+        update_badge_progress(badge, card_count)
+
+    return card_count
+
+
+def update_badge_progress(badge, card_count):
+    progress = badge.find('span', class_='progress_info_bold')
+
+    if not progress:
+        return None
+
+    if card_count:
+        progress.string = '{} card drops remaining'.format(card_count)
+    else:
+        progress.string = 'No card drops remaining'
+
+    game_id = get_game_id(badge)
+
+    # All foil badges have the same game id, so they can't be updated by it
+    if game_id != str(000000):
+        stlib.cache.update_badge(stlib.steam_user, game_id, card_count, str(badge))
+
+
+def start_next_badges(badges, max_games, dry_run=False):
+    global current_badge
+
+    started_badges = []
+
+    while len(running_badges) < max_games and current_badge < len(badges):
+        badge = badges[current_badge]
+        current_badge += 1
+
+        running_badges.append(badge)
+        started_badges.append(badge)
+        record_card_count(badge, get_card_count(badge))
+
+        stlib.metrics.inc('games_started_total')
+        stlib.metrics.event('game_started', game_id=get_game_id(badge), remaining=get_card_count(badge))
+
+        if not dry_run:
+            stlib.libsteam.run_wrapper(get_game_id(badge))
+
+    return started_badges
+
+
+def update_card_counts(badges):
+    pages = {}
+
+    for badge in badges:
+        pages.setdefault(badge_pages.get(get_game_id(badge)), []).append(badge)
+
+    # A badge page holds the counts of many games, so it's cheaper
+    # than one gamecards page for each running game in the same page
+    batch_pages = [page for page, page_badges in pages.items() if page and len(page_badges) > 1]
+    updated_badges = {}
+
+    for page_badges in stlib.network.map_async(get_badges, batch_pages):
+        for badge in page_badges:
+            updated_badges[get_game_id(badge)] = badge
+
+    def update(badge):
+        updated_badge = updated_badges.get(get_game_id(badge))
+
+        if updated_badge is None:
+            return get_card_count(badge, True)
+
+        card_count = get_card_count(updated_badge)
+        update_badge_progress(badge, card_count)
+
+        return card_count
+
+    return list(stlib.network.map_async(update, badges))
+
+
+def update_running_badges(dry_run=False):
+    finished_badges = []
+    card_counts = update_card_counts(running_badges)
+
+    for badge, card_count in zip(list(running_badges), card_counts):
+        record_card_count(badge, card_count)
+
+        if card_count == 0:
+            running_badges.remove(badge)
+            finished_badges.append(badge)
+
+            stlib.metrics.inc('games_finished_total')
+            stlib.metrics.event('game_finished', game_id=get_game_id(badge))
+
+            if not dry_run:
+                stlib.libsteam.stop_wrapper(get_game_id(badge))
+
+    return finished_badges
+
+
+def reset_running_badges():
+    global current_badge
+
+    current_badge = 0
+    del running_badges[:]
+    drop_stats.clear()
+
+
+def get_drop_interval():
+    if drop_interval:
+        return drop_interval
+
+    return stlib.config.getint('CardFarming', 'initialDropInterval', fallback=1200)
+
+
+def record_card_count(badge, card_count):
+    global drop_interval
+
+    game_id = get_game_id(badge)
+    now = time.time()
+
+    if game_id in drop_stats and card_count < drop_stats[game_id]['card_count']:
+        dropped_cards = drop_stats[game_id]['card_count'] - card_count
+        stlib.metrics.inc('card_drops_total', dropped_cards)
+        stlib.metrics.event('card_drop', game_id=game_id, cards=dropped_cards, remaining=card_count)
+
+    if game_id not in drop_stats or card_count == 0:
+        drop_stats[game_id] = {'card_count': card_count, 'last_drop': now, 'misses': 0}
+        return None
+
+    stats = drop_stats[game_id]
+
+    if card_count < stats['card_count']:
+        # Cards dropped since the last check, so the drop happened
+        # somewhere between the last drop and now
+        interval = (now - stats['last_drop']) / (stats['card_count'] - card_count)
+
+        if drop_interval:
+            drop_interval = 0.7 * drop_interval + 0.3 * interval
+        else:
+            drop_interval = interval
+
+        stlib.logger.verbose('Card drop interval is now %d seconds', drop_interval)
+        stats.update(card_count=card_count, last_drop=now, misses=0)
+    elif now >= stats['last_drop'] + get_drop_interval():
+        stats['misses'] += 1
+
+
+def get_next_poll_delay():
+    min_delay = stlib.config.getint('CardFarming', 'minPollInterval', fallback=40)
+    max_delay = stlib.config.getint('CardFarming', 'maxPollInterval', fallback=900)
+    next_drop = get_drop_interval()
+    now = time.time()
+    delays = []
+
+    for badge in running_badges:
+        stats = drop_stats.get(get_game_id(badge))
+
+        if not stats:
+            delays.append(min_delay)
+            continue
+
+        expected_drop = stats['last_drop'] + next_drop
+
+        if expected_drop > now:
+            # There's no reason to check before the next drop is expected
+            delay = expected_drop - now
+        else:
+            # The drop is late. Check often, but back off while it doesn't come
+            delay = min_delay * 2 ** stats['misses']
+
+        delays.append(min(max(delay, min_delay), max_delay))
+
+    if not delays:
+        return min_delay
+
+    return int(min(delays))
+
+
+def normalize_game_name(game_name):
+    return ' '.join(game_name.lower().split())
 
 
 def get_cards_info():
     stlib.logger.info('Getting cards info')
-    cards_info = {k: [] for k in ['game_name', 'card_count', 'badge_price']}
-    html = stlib.network.get_html('http://www.steamcardexchange.net/index.php?badgeprices')
+    config_parser = stlib.config.read()
+    cache_ttl = config_parser.getint('CardFarming', 'priceCacheTTL', fallback=86400)
+    cached_prices = stlib.cache.get_blob(PRICES_BLOB)
+
+    if cached_prices and time.time() - cached_prices['last_checked'] < cache_ttl:
+        stlib.logger.verbose('Using cached cards info')
+        return index_cards_info(load_cards_columns(cached_prices['data']))
+
+    headers = stlib.cache.get_blob_validators(cached_prices)
+    response = stlib.network.get_response(stlib.badge_prices_page, headers=headers)
+
+    if cached_prices:
+        if not response:
+            stlib.logger.warning('Unable to update cards info. Using the cached one.')
+            return index_cards_info(load_cards_columns(cached_prices['data']))
+
+        if response.status_code == 304:
+            stlib.logger.verbose('Cards info was not modified')
+            stlib.cache.touch_blob(PRICES_BLOB)
+            return index_cards_info(load_cards_columns(cached_prices['data']))
+
+    if not response:
+        stlib.logger.error('Unable to get cards info')
+        return index_cards_info(new_cards_columns())
+
+    html = stlib.extractor.parse(response.content, 'badge_prices')
+    cards_columns = parse_cards_columns(html)
+
+    stlib.cache.save_blob(PRICES_BLOB,
+                          response.headers.get('ETag'),
+                          response.headers.get('Last-Modified'),
+                          dump_cards_columns(cards_columns))
+
+    return index_cards_info(cards_columns)
+
+
+def new_cards_columns():
+    return {'game_id': array.array('i'),
+            'game_name': [],
+            'card_count': array.array('H'),
+            'badge_price': array.array('d')}
+
+
+def parse_cards_columns(html):
+    cards_columns = new_cards_columns()
 
     for info in html.findAll('tr')[1:]:
-        cards_info['game_name'].append(info.find('a').text)
-        cards_info['card_count'].append(int(info.findAll('td')[1].text))
-        cards_info['badge_price'].append(float(info.findAll('td')[2].text[1:]))
+        link = info.find('a')
+        columns = info.findAll('td')
+
+        # index.php?gamepage-appid-<game id>
+        game_id = link.get('href', '').rsplit('-', 1)[-1]
+
+        cards_columns['game_id'].append(int(game_id) if game_id.isdigit() else -1)
+        cards_columns['game_name'].append(link.text)
+        cards_columns['card_count'].append(int(columns[1].text))
+        cards_columns['badge_price'].append(float(columns[2].text[1:]))
+
+    return cards_columns
+
+
+def dump_cards_columns(cards_columns):
+    game_names = '\0'.join(cards_columns['game_name']).encode('utf-8')
+
+    return b''.join([struct.pack('<I', len(cards_columns['game_name'])),
+                     cards_columns['game_id'].tobytes(),
+                     cards_columns['card_count'].tobytes(),
+                     cards_columns['badge_price'].tobytes(),
+                     game_names])
+
+
+def load_cards_columns(data):
+    cards_columns = new_cards_columns()
+    rows = struct.unpack_from('<I', data)[0]
+    offset = struct.calcsize('<I')
+
+    for column in ['game_id', 'card_count', 'badge_price']:
+        size = rows * cards_columns[column].itemsize
+        cards_columns[column].frombytes(data[offset:offset + size])
+        offset += size
+
+    if rows:
+        cards_columns['game_name'] = bytes(data[offset:]).decode('utf-8').split('\0')
+
+    return cards_columns
+
+
+def index_cards_info(cards_columns):
+    cards_info = {'by_id': {}, 'by_name': {}}
+
+    for game_id, game_name, card_count, badge_price in zip(cards_columns['game_id'],
+                                                            cards_columns['game_name'],
+                                                            cards_columns['card_count'],
+                                                            cards_columns['badge_price']):
+        card_info = (card_count, badge_price)
+        cards_info['by_name'][normalize_game_name(game_name)] = card_info
+
+        if game_id >= 0:
+            cards_info['by_id'][str(game_id)] = card_info
 
     return cards_info
 
 
-def get_badge_price(cards_info, badge):
-    game_name = get_game_name(badge)
-    stlib.logger.verbose('Getting badge price for %s', game_name)
+def parse_cards_info(html):
+    return index_cards_info(parse_cards_columns(html))
+
 
+def __get_card_info(cards_info, badge):
     try:
-        price_index = cards_info['game_name'].index(game_name)
-        return cards_info['badge_price'][price_index]
-    except ValueError:
-        return 0
+        return cards_info['by_id'][get_game_id(badge)]
+    except KeyError:
+        return cards_info['by_name'].get(normalize_game_name(get_game_name(badge)), (0, 0))
+
+
+def get_badge_price(cards_info, badge):
+    stlib.logger.verbose('Getting badge price for %s', get_game_name(badge))
+    return __get_card_info(cards_info, badge)[1]
 
 
 def get_badge_cards_count(cards_info, badge):
-    game_name = get_game_name(badge)
-    stlib.logger.info('Getting cards count for %s', game_name)
-    return cards_info['card_count'][cards_info['game_name'].index(game_name)]
+    stlib.logger.info('Getting cards count for %s', get_game_name(badge))
+    return __get_card_info(cards_info, badge)[0]
 
 
 def get_total_card_count(badges):
@@ -136,14 +519,4 @@ def get_total_card_count(badges):
 
 def order_by_most_valuable(cards_info, badges):
     stlib.logger.info("Ordering by most valuable")
-    prices = [get_badge_price(cards_info, badge) for badge in badges]
-    badges_count = len(badges)
-    badges_order = sorted(range(badges_count),
-                          key=lambda key: prices[key],
-                          reverse=True)
-    ordered_badges = []
-
-    for _ in prices:
-        ordered_badges = [badges[index] for index in badges_order]
-
-    return ordered_badges
+    return sorted(badges, key=lambda badge: get_badge_price(cards_info, badge), reverse=True)
@@ -19,7 +19,13 @@
 import configparser
 import logging
 import os
+import shutil
 import sys
+import tempfile
+import time
+
+import gevent
+import gevent.monkey
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +40,23 @@ config_file_path = os.path.join(data_dir, 'steam-tools', config_file_name)
 config_parser = configparser.RawConfigParser()
 config_parser.optionxform = str
 
+# Seconds between checks for external changes in the config file
+CHECK_INTERVAL = 1
+# Seconds to wait for more changes before writing the config file
+WRITE_DELAY = 2
+
+loaded_mtime = None
+last_check = 0
+dirty = False
+last_write = 0
+flush_scheduled = False
+cached_values = {}
+
+# Config is also written by the workers, which are real threads
+lock = gevent.monkey.get_original('threading', 'RLock')()
+get_thread_ident = gevent.monkey.get_original('threading', 'get_ident')
+main_thread_ident = get_thread_ident()
+
 os.makedirs(os.path.dirname(config_file_path), exist_ok=True)
 
 if not os.path.isfile(config_file_path):
@@ -46,16 +69,126 @@ if not os.path.isfile(config_file_path):
     config_parser.add_section('SteamTrades')
     config_parser.add_section('SteamGifts')
     config_parser.add_section('Auth')
+    config_parser.add_section('Network')
 
     with open(config_file_path, 'w') as FP:
         config_parser.write(FP)
 
 
+def __get_mtime():
+    try:
+        return os.path.getmtime(config_file_path)
+    except OSError:
+        return None
+
+
 def read():
-    config_parser.read(config_file_path)
+    global loaded_mtime, last_check
+
+    with lock:
+        if dirty and time.time() - last_write >= WRITE_DELAY:
+            flush()
+
+        now = time.time()
+
+        # Pending changes in memory are newer than the file
+        if not dirty and now - last_check >= CHECK_INTERVAL:
+            last_check = now
+            mtime = __get_mtime()
+
+            if mtime != loaded_mtime:
+                config_parser.read(config_file_path)
+                loaded_mtime = mtime
+                cached_values.clear()
+
     return config_parser
 
 
+def __get(getter, section, option, fallback):
+    key = (getter, section, option, fallback)
+
+    try:
+        return cached_values[key]
+    except KeyError:
+        value = getattr(read(), getter)(section, option, fallback=fallback)
+        cached_values[key] = value
+
+        return value
+
+
+def get(section, option, fallback=None):
+    return __get('get', section, option, fallback)
+
+
+def getint(section, option, fallback=None):
+    return __get('getint', section, option, fallback)
+
+
+def getfloat(section, option, fallback=None):
+    return __get('getfloat', section, option, fallback)
+
+
+def getboolean(section, option, fallback=None):
+    return __get('getboolean', section, option, fallback)
+
+
+def __delayed_flush():
+    global flush_scheduled
+
+    wait_time = last_write + WRITE_DELAY - time.time()
+
+    # Changed again while waiting
+    if wait_time > 0:
+        gevent.spawn_later(wait_time, __delayed_flush)
+        return None
+
+    flush_scheduled = False
+    flush()
+
+
 def write():
-    with open(config_file_path, 'w') as config_file:
-        config_parser.write(config_file)
+    global dirty, last_write, flush_scheduled
+
+    dirty = True
+    last_write = time.time()
+    cached_values.clear()
+
+    # Greenlets spawned by workers would never run. Their
+    # changes are written by the next read in the main thread
+    if not flush_scheduled and get_thread_ident() == main_thread_ident:
+        flush_scheduled = True
+        gevent.spawn_later(WRITE_DELAY, __delayed_flush)
+
+
+def flush():
+    global dirty, loaded_mtime
+
+    with lock:
+        if not dirty:
+            return None
+
+        # Created private, so the cookies are never readable by others
+        temp_file, temp_file_path = tempfile.mkstemp(suffix='.tmp',
+                                                     prefix=config_file_name,
+                                                     dir=os.path.dirname(config_file_path))
+
+        try:
+            # Keep the permissions the user gave to the config file
+            shutil.copymode(config_file_path, temp_file_path)
+        except OSError:
+            pass
+
+        try:
+            with os.fdopen(temp_file, 'w') as config_file:
+                config_parser.write(config_file)
+                config_file.flush()
+                os.fsync(config_file.fileno())
+
+            # The config file is never seen half written
+            os.replace(temp_file_path, config_file_path)
+        except OSError:
+            os.remove(temp_file_path)
+            raise
+
+        loaded_mtime = __get_mtime()
+        dirty = False
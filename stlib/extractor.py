@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+
+import bs4
+
+# NEVER import full stlib module here!!! (cyclic)
+from stlib import profiler
+
+try:
+    # noinspection PyUnresolvedReferences
+    import lxml
+
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# Elements that must be kept when parsing each known page, by tag
+# or by class. Everything outside them is thrown away by the parser.
+PAGES = {
+    'badges': {'classes': ['badge_title_row', 'pagelink']},
+    'badge_prices': {'tag': 'tr'},
+    'gamecards': {'classes': ['badge_title_stats_drops']},
+    'giveaways': {'classes': ['widget-container', 'nav__points']},
+    'giveaway': {'classes': ['sidebar', 'nav__points']},
+    'trade': {'tag': 'form'},
+    'steam_login': {'classes': ['supernav_container']},
+    'steamgifts_login': {'tag': 'form'},
+    'steamtrades_login': {'classes': ['nav_avatar']},
+    'steamcompanion_login': {'classes': ['profile']},
+}
+
+# Single values extracted from each known page, as simple css selectors
+FIELDS = {
+    'gamecards': {
+        'stats': 'div.badge_title_stats_drops',
+        'card_drops': 'div.badge_title_stats_drops span.progress_info_bold',
+    },
+    'steamgifts': {
+        'points': 'span.nav__points',
+    },
+}
+
+
+def __class_strainer(classes):
+    classes = set(classes)
+
+    return bs4.SoupStrainer(class_=lambda class_: class_ is not None and not classes.isdisjoint(class_.split()))
+
+
+def get_strainer(page_type):
+    try:
+        page = PAGES[page_type]
+    except KeyError:
+        return None
+
+    if 'tag' in page:
+        return bs4.SoupStrainer(page['tag'])
+    else:
+        return __class_strainer(page['classes'])
+
+
+@profiler.timed('extractor.parse')
+def parse(content, page_type=None):
+    return bs4.BeautifulSoup(content, HTML_PARSER, parse_only=get_strainer(page_type))
+
+
+@profiler.timed('extractor.extract')
+def extract(content, page_type):
+    fields = {}
+
+    if HTMLParser:
+        tree = HTMLParser(content)
+
+        for field, selector in FIELDS[page_type].items():
+            node = tree.css_first(selector)
+            fields[field] = node.text() if node else None
+    else:
+        # The first class of each selector is enough to keep the whole path
+        classes = [selector.split(' ', 1)[0].split('.', 1)[1] for selector in FIELDS[page_type].values()]
+        html = bs4.BeautifulSoup(content, HTML_PARSER, parse_only=__class_strainer(classes))
+
+        for field, selector in FIELDS[page_type].items():
+            node = html.select_one(selector)
+            fields[field] = node.text if node else None
+
+    return fields
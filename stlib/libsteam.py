@@ -17,15 +17,24 @@
 #
 
 import ctypes
+import io
 import os
 import subprocess
 import sys
+import time
+
+import gevent.lock
 
 import stlib
 
 if os.name is 'posix':
     import site
 
+supervisor_process = None
+# The reply is read cooperatively, so another greenlet could send its
+# command in the middle. Only greenlets use it, a real lock would block them
+supervisor_lock = gevent.lock.Semaphore()
+
 
 def _find_libsteam():
     if os.name == 'nt':
@@ -67,44 +76,178 @@ def _find_wrapper():
                 return full_path
 
 
-def run_wrapper(app_id):
+class HostedApp:
+    def __init__(self, app_id, error=None):
+        self.app_id = app_id
+        self.returncode = 1 if error else None
+        self.stderr = io.BytesIO((error or '').encode('utf-8'))
+
+    def poll(self):
+        if self.returncode is None:
+            reply = _supervisor_command('status', self.app_id)
+
+            if reply[0] != 'running':
+                self.returncode = _get_returncode(reply)
+
+        return self.returncode
+
+    def wait(self):
+        while self.poll() is None:
+            time.sleep(1)
+
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = _get_returncode(_supervisor_command('stop', self.app_id))
+
+    def kill(self):
+        self.terminate()
+
+    def communicate(self, timeout=None):
+        return b'', self.stderr.getvalue()
+
+
+def _get_wrapper_exec(*params):
     wrapper_path = _find_wrapper()
 
     if not wrapper_path:
         stlib.logger.critical('Unable to find libsteam wrapper!')
         return None
 
-    wrapper_exec = [wrapper_path, app_id, _find_libsteam()]
+    wrapper_exec = [wrapper_path] + list(params)
 
     if wrapper_path[-3:] != 'exe':
         wrapper_exec = ['python'] + wrapper_exec
 
-    stlib.wrapper_process = subprocess.Popen(wrapper_exec, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return wrapper_exec
+
+
+def _get_returncode(reply):
+    if reply[0] == 'exited':
+        return int(reply[1])
+    else:
+        return 1
+
+
+def start_supervisor():
+    global supervisor_process
+
+    wrapper_exec = _get_wrapper_exec('--supervisor', os.path.abspath(_find_libsteam()))
+
+    if not wrapper_exec:
+        return None
+
+    stlib.logger.verbose('Starting libsteam supervisor')
+    supervisor_process = subprocess.Popen(wrapper_exec, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    return supervisor_process
+
+
+def stop_supervisor():
+    global supervisor_process
+
+    if not supervisor_process:
+        return None
+
+    stlib.logger.verbose('Closing libsteam supervisor')
+
+    try:
+        supervisor_process.stdin.write(b'quit\n')
+        supervisor_process.stdin.flush()
+        supervisor_process.communicate(timeout=20)
+    except (BrokenPipeError, subprocess.TimeoutExpired):
+        supervisor_process.kill()
+        supervisor_process.communicate()
+
+    supervisor_process = None
+
+
+def _supervisor_command(command, app_id):
+    with supervisor_lock:
+        if not supervisor_process or supervisor_process.poll() is not None:
+            if not start_supervisor():
+                return ['error', 'Unable to start libsteam supervisor']
+
+        try:
+            supervisor_process.stdin.write('{} {}\n'.format(command, app_id).encode('utf-8'))
+            supervisor_process.stdin.flush()
+            reply = supervisor_process.stdout.readline().decode('utf-8').strip()
+        except BrokenPipeError:
+            reply = ''
+
+    if not reply:
+        return ['error', 'libsteam supervisor is not responding']
+
+    return reply.split(' ', 1)
+
+
+def run_wrapper(app_id):
+    config_parser = stlib.config.read()
+
+    if config_parser.getboolean('Config', 'libsteamSupervisor', fallback=os.name == 'posix'):
+        reply = _supervisor_command('start', app_id)
+
+        if reply[0] == 'ok':
+            process = HostedApp(app_id)
+        else:
+            stlib.logger.error(reply[1])
+            process = HostedApp(app_id, reply[1])
+    else:
+        wrapper_exec = _get_wrapper_exec(app_id, _find_libsteam())
+
+        if not wrapper_exec:
+            return None
 
+        process = subprocess.Popen(wrapper_exec, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-def stop_wrapper():
-    stlib.logger.verbose('Closing wrapper subprocess...')
+    stlib.wrapper_processes[app_id] = process
+    stlib.wrapper_process = process
 
+    return process
+
+
+def _stop_process(process):
     try:
-        stlib.wrapper_process.terminate()
+        process.terminate()
     except ProcessLookupError:
         stlib.logger.verbose('subprocess is already terminated.')
         return 1
 
     try:
         stlib.logger.verbose("Waiting to wrapper subprocess terminate.")
-        stlib.wrapper_process.communicate(timeout=20)
+        process.communicate(timeout=20)
     except subprocess.TimeoutExpired:
         stlib.logger.verbose("Force killing wrapper subprocess.")
-        stlib.wrapper_process.kill()
-        stlib.wrapper_process.communicate()
+        process.kill()
+        process.communicate()
+
+    if process.returncode:
+        return 1
+    else:
+        return 0
+
 
-    if stlib.wrapper_process.returncode:
-        return_ = 1
+def stop_wrapper(app_id=None):
+    if app_id:
+        app_ids = [app_id]
     else:
-        return_ = 0
+        app_ids = list(stlib.wrapper_processes)
+
+    return_ = 0
+
+    for app_id in app_ids:
+        stlib.logger.verbose('Closing wrapper subprocess for %s...', app_id)
+        process = stlib.wrapper_processes.pop(app_id, None)
+
+        if not process:
+            continue
+
+        return_ |= _stop_process(process)
+
+        if process is stlib.wrapper_process:
+            stlib.wrapper_process = None
 
-    stlib.wrapper_process = None
     return return_
 
 
@@ -116,9 +259,17 @@ def is_steam_running():
         return False
 
 
-def is_wrapper_running():
-    if not stlib.wrapper_process or \
-            stlib.wrapper_process.poll():
+def is_wrapper_running(app_id=None):
+    if app_id:
+        process = stlib.wrapper_processes.get(app_id)
+    else:
+        process = stlib.wrapper_process
+
+    if not process or process.poll():
         return False
     else:
         return True
+
+
+def get_failed_wrappers():
+    return [app_id for app_id, process in stlib.wrapper_processes.items() if process.poll()]
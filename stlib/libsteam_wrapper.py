@@ -15,30 +15,188 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #
+# Usage:
+#   libsteam_wrapper <app id> <libsteam path>
+#   libsteam_wrapper --supervisor <libsteam path>
+#
+# In supervisor mode, commands are read from stdin, one per line,
+# and each one is answered with one line on stdout:
+#   start <app id>  -> ok | error <message>
+#   stop <app id>   -> exited <return code> | error <message>
+#   status <app id> -> running | exited <return code> | error <message>
+#   quit
 
 import os
 import sys
 import ctypes
+import signal
+import subprocess
 import time
 
-if __name__ == "__main__":
-    if len(sys.argv) > 2:
-        os.environ["SteamAppId"] = sys.argv[1]
 
-        try:
-            steam_api = ctypes.CDLL(sys.argv[2])
-        except OSError:
-            sys.exit(1)
+def run_app(app_id, libsteam_path):
+    os.environ["SteamAppId"] = app_id
 
-        if not steam_api.SteamAPI_Init():
-            sys.exit(1)
+    try:
+        steam_api = ctypes.CDLL(libsteam_path)
+    except OSError:
+        sys.exit(1)
+
+    if not steam_api.SteamAPI_Init():
+        sys.exit(1)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        os.environ.pop("SteamAppId")
+        steam_api.SteamAPI_Shutdown()
+        sys.exit(0)
 
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            os.environ.pop("SteamAppId")
+
+def fork_app(steam_api, app_id):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        os.close(read_fd)
+        os.environ["SteamAppId"] = app_id
+
+        def shutdown(signum, frame):
             steam_api.SteamAPI_Shutdown()
+            os._exit(0)
+
+        signal.signal(signal.SIGTERM, shutdown)
+
+        if not steam_api.SteamAPI_Init():
+            os.write(write_fd, b'0')
+            os._exit(1)
+
+        os.write(write_fd, b'1')
+        os.close(write_fd)
+
+        while True:
+            signal.pause()
+
+    os.close(write_fd)
+    status = os.read(read_fd, 1)
+    os.close(read_fd)
+
+    if status != b'1':
+        os.waitpid(pid, 0)
+        return None
+
+    return pid
+
+
+def spawn_app(app_id, libsteam_path):
+    if hasattr(sys, "frozen"):
+        wrapper_exec = [sys.executable]
+    else:
+        wrapper_exec = [sys.executable, os.path.abspath(__file__)]
+
+    process = subprocess.Popen(wrapper_exec + [app_id, libsteam_path], stdout=subprocess.DEVNULL)
+
+    # Give SteamAPI_Init some time to fail
+    time.sleep(1)
+
+    if process.poll() is not None:
+        return None
+
+    return process
+
+
+def get_returncode(app):
+    if isinstance(app, int):
+        pid, status = os.waitpid(app, os.WNOHANG)
+
+        if not pid:
+            return None
+
+        if os.WIFSIGNALED(status):
+            return -os.WTERMSIG(status)
+        else:
+            return os.WEXITSTATUS(status)
+    else:
+        return app.poll()
+
+
+def stop_app(app):
+    if isinstance(app, int):
+        os.kill(app, signal.SIGTERM)
+        pid, status = os.waitpid(app, 0)
+
+        if os.WIFSIGNALED(status):
+            return -os.WTERMSIG(status)
+        else:
+            return os.WEXITSTATUS(status)
+    else:
+        app.terminate()
+        return app.wait()
+
+
+def supervisor(libsteam_path):
+    try:
+        # Loaded only once. Forked apps will share it.
+        steam_api = ctypes.CDLL(libsteam_path)
+    except OSError:
+        sys.exit(1)
+
+    apps = {}
+
+    def reply(*message):
+        sys.stdout.write(' '.join(str(item) for item in message) + '\n')
+        sys.stdout.flush()
+
+    for line in sys.stdin:
+        command, _, app_id = line.strip().partition(' ')
+
+        if command == 'quit':
+            break
+
+        if command == 'start':
+            if app_id in apps and get_returncode(apps[app_id]) is None:
+                reply('ok')
+                continue
+
+            if hasattr(os, 'fork'):
+                app = fork_app(steam_api, app_id)
+            else:
+                app = spawn_app(app_id, libsteam_path)
+
+            if app:
+                apps[app_id] = app
+                reply('ok')
+            else:
+                reply('error', 'Unable to start {}. Is it a valid gameID?'.format(app_id))
+        elif command in ['stop', 'status']:
+            if app_id not in apps:
+                reply('error', '{} is not running.'.format(app_id))
+                continue
+
+            if command == 'stop':
+                reply('exited', stop_app(apps.pop(app_id)))
+            else:
+                returncode = get_returncode(apps[app_id])
+
+                if returncode is None:
+                    reply('running')
+                else:
+                    del apps[app_id]
+                    reply('exited', returncode)
+        else:
+            reply('error', 'Unknown command {}'.format(command))
+
+    for app in apps.values():
+        stop_app(app)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        if sys.argv[1] == '--supervisor':
+            supervisor(sys.argv[2])
             sys.exit(0)
+        else:
+            run_app(sys.argv[1], sys.argv[2])
 
     sys.exit(1)
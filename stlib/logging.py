@@ -16,7 +16,9 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #
 
+import atexit
 import codecs
+import collections
 import locale
 import logging
 import logging.handlers
@@ -25,6 +27,8 @@ import shutil
 import sys
 import tempfile
 
+import gevent.monkey
+
 # NEVER import full stlib module here!!! (cyclic)
 from stlib import config as stconfig
 
@@ -48,6 +52,87 @@ class ColoredFormatter(logging.Formatter):
         return msg.replace('\n', '\n     ')
 
 
+class LogBuffer:
+    def __init__(self, max_size):
+        self.records = collections.deque()
+        self.max_size = max_size
+        self.dropped = 0
+        # Used by real threads, so the gevent lock is not enough here
+        self.lock = gevent.monkey.get_original('threading', 'Lock')()
+
+    # Called by logging.handlers.QueueHandler
+    def put_nowait(self, record):
+        with self.lock:
+            if len(self.records) >= self.max_size:
+                self.dropped += 1
+            else:
+                self.records.append(record)
+
+    def get_batch(self):
+        with self.lock:
+            records = list(self.records)
+            self.records.clear()
+            dropped = self.dropped
+            self.dropped = 0
+
+        return records, dropped
+
+
+class BatchedFileHandler(logging.handlers.RotatingFileHandler):
+    # Flushed by the LogWriter once for each batch of records
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class LogWriter:
+    # Like logging.handlers.QueueListener, but gevent would turn
+    # its thread into a greenlet, so a real thread is used instead
+    def __init__(self, buffer, handlers, flush_interval):
+        self.buffer = buffer
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self.running = False
+        self.lock = gevent.monkey.get_original('threading', 'Lock')()
+        self.sleep = gevent.monkey.get_original('time', 'sleep')
+
+    def start(self):
+        self.running = True
+        gevent.monkey.get_original('_thread', 'start_new_thread')(self._run, ())
+
+    def stop(self):
+        self.running = False
+        self.write_batch()
+
+    def _run(self):
+        while self.running:
+            self.sleep(self.flush_interval)
+            self.write_batch()
+
+    def write_batch(self):
+        with self.lock:
+            records, dropped = self.buffer.get_batch()
+
+            if dropped:
+                records.append(logging.makeLogRecord({'name': 'SteamTools',
+                                                      'levelno': logging.WARNING,
+                                                      'levelname': 'WARNING',
+                                                      'msg': '{} log messages were dropped'.format(dropped)}))
+
+            if not records:
+                return None
+
+            for record in records:
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+            for handler in self.handlers:
+                handler.flush_batch()
+
+
 def encoder(buffer, error='replace'):
     writer = codecs.getwriter(locale.getpreferredencoding())
     return writer(buffer, error)
@@ -90,16 +175,14 @@ def get_logger():
     # --- ~ --- ~ --- ~ --- ~ --- ~ --- #
 
     # --- Logfile Handler --- #
-    log_file = logging.handlers.RotatingFileHandler(os.path.join(log_file_path, log_file_name),
-                                                    backupCount=1,
-                                                    encoding='utf-8')
+    log_file = BatchedFileHandler(os.path.join(log_file_path, log_file_name), backupCount=1, encoding='utf-8')
     log_file.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
     log_file.setLevel(eval('logging.' + log_file_level.upper()))
     log_file.doRollover()
-    logger.addHandler(log_file)
     # --- ~ --- ~ --- ~ --- ~ #
 
     # --- Console Handler --- #
+    # Written synchronously to keep the order with console_msg
     console = logging.StreamHandler(encoder(sys.stdout.buffer))
     console.setFormatter(ColoredFormatter())
     console.setLevel(eval('logging.' + console_level.upper()))
@@ -107,17 +190,55 @@ def get_logger():
     # --- ~ --- ~ --- ~ --- ~ #
 
     # --- Requests Logfile handler --- #
-    httpfile = logging.handlers.RotatingFileHandler(os.path.join(log_file_path, 'requests_' + log_file_name),
-                                                    backupCount=1,
-                                                    encoding='utf-8')
+    httpfile = BatchedFileHandler(os.path.join(log_file_path, 'requests_' + log_file_name),
+                                  backupCount=1,
+                                  encoding='utf-8')
     httpfile.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
     httpfile.setLevel(logging.DEBUG)
     httpfile.doRollover()
+    # --- ~ --- ~ --- ~ --- ~ --- ~ --- #
+
+    # --- Log writer --- #
+    # Files are written by another thread. Loggers only put records in the buffer
+    buffer = LogBuffer(config_parser.getint('Debug', 'logBufferSize', fallback=10000))
+    flush_interval = config_parser.getfloat('Debug', 'logFlushInterval', fallback=0.5)
+
+    log_file_queue = logging.handlers.QueueHandler(buffer)
+    log_file_queue.setLevel(log_file.level)
+    logger.addHandler(log_file_queue)
 
     requests = logging.getLogger("requests.packages.urllib3")
     requests.setLevel(logging.DEBUG)
-    # requests.removeHandler('SteamTools')
-    requests.addHandler(httpfile)
+    requests.addHandler(logging.handlers.QueueHandler(buffer))
+
+    # Records of all loggers are in the same buffer
+    log_file.addFilter(lambda record: record.name == 'SteamTools')
+    httpfile.addFilter(lambda record: record.name.startswith('requests'))
+    handlers = [log_file, httpfile]
+
+    # --- Events Logfile handler --- #
+    events = logging.getLogger('SteamTools.events')
+    events.propagate = False
+
+    if config_parser.getboolean('Debug', 'eventLog', fallback=False):
+        events_file_name = os.path.splitext(log_file_name)[0] + '.jsonl'
+        events_file = BatchedFileHandler(os.path.join(log_file_path, 'events_' + events_file_name),
+                                         backupCount=1,
+                                         encoding='utf-8')
+        events_file.setFormatter(logging.Formatter('%(message)s'))
+        events_file.addFilter(lambda record: record.name == 'SteamTools.events')
+        events_file.doRollover()
+        handlers.append(events_file)
+
+        events.setLevel(logging.INFO)
+        events.addHandler(logging.handlers.QueueHandler(buffer))
+    else:
+        events.setLevel(logging.CRITICAL + 1)
     # --- ~ --- ~ --- ~ --- ~ --- ~ --- #
 
+    log_writer = LogWriter(buffer, handlers, flush_interval)
+    log_writer.start()
+    atexit.register(log_writer.stop)
+    # --- ~ --- ~ --- ~ --- ~ #
+
     return logger
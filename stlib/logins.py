@@ -16,15 +16,20 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #
 
-import gc
+import hashlib
 import sys
 
-import bs4
 import gevent
+import gevent.event
 
 import stlib
 import ui
 
+# Background network tasks still running and what happened to them so far
+tasks = set()
+task_counters = {'started': 0, 'finished': 0, 'killed': 0}
+tasks_changed = gevent.event.Event()
+
 if stlib.gui_mode:
     import gi
 
@@ -32,112 +37,187 @@ if stlib.gui_mode:
     from gi.repository import Gtk
 
 
-def check_steam_login(greenlet):
+def get_steam_user(response):
+    html = stlib.extractor.parse(response.content, 'steam_login')
+    supernav = html.find('div', class_='supernav_container')
+    return supernav.find('a', class_='username').text.strip()
+
+
+def get_steamgifts_user(response):
+    html = stlib.extractor.parse(response.content, 'steamgifts_login')
+    form = html.findAll('form')[1]
+    return form.find('input', {'name': 'username'}).get('value')
+
+
+def get_steamtrades_user(response):
+    html = stlib.extractor.parse(response.content, 'steamtrades_login')
+    avatar = html.find('a', class_='nav_avatar')
+
+    if not avatar:
+        raise AttributeError
+
+    # FIXME: get username from steamapi
+    return avatar['href'].split('/')[2]
+
+
+def get_steamcompanion_user(response):
+    html = stlib.extractor.parse(response.content, 'steamcompanion_login')
+    user = html.find('div', class_='profile').find('a').text.strip()
+
+    if not user:
+        raise AttributeError
+
+    return user
+
+
+def get_cookies_fingerprint(service_name):
+    config_parser = stlib.config.read()
+    # noinspection PyProtectedMember
+    cookies = config_parser._sections.get(service_name + 'Cookies')
+
+    if not cookies:
+        return None
+
+    return hashlib.sha1(repr(sorted(cookies.items())).encode('utf-8')).hexdigest()
+
+
+def get_user(service_name, use_cache=True):
+    cache_ttl = stlib.config.getint('Config', 'loginCacheTTL', fallback=600)
+    fingerprint = get_cookies_fingerprint(service_name)
+
+    if fingerprint and use_cache:
+        user = stlib.cache.get_login(service_name, fingerprint, cache_ttl)
+
+        if user:
+            stlib.logger.verbose('Using cached login for %s', service_name)
+            return user
+
+    url = eval(''.join(['stlib.', service_name, '_check_page']))
+    response = stlib.network.try_get_response(service_name, url)
+
     try:
-        html = bs4.BeautifulSoup(greenlet.value.content, 'html.parser')
-        supernav = html.find('div', class_='supernav_container')
-        stlib.steam_user = supernav.find('a', class_='username').text.strip()
-    except(AttributeError, IndexError):
-        stlib.steam_user = None
+        user = eval(''.join(['get_', service_name, '_user']))(response)
+    except(AttributeError, IndexError, TypeError):
+        return None
+
+    # A page fetched without cookies says nothing about them
+    if not response.request.headers.get('Cookie'):
+        return user
+
+    # The cookies may be changed by the auto recovery
+    stlib.cache.save_login(service_name, get_cookies_fingerprint(service_name), user)
+
+    return user
+
+
+def check_steam_login(greenlet):
+    stlib.steam_user = greenlet.value
+
+    if not stlib.steam_user:
         stlib.logger.error('Steam login status: Cookies not found' +
                            '\nPlease, check if you are logged in on' +
                            '\nsteampowered.com or steamcommunity.com')
 
 
 def check_steamgifts_login(greenlet):
-    try:
-        html = bs4.BeautifulSoup(greenlet.value.content, 'html.parser')
-        form = html.findAll('form')[1]
-        stlib.SG_user = form.find('input', {'name': 'username'}).get('value')
-    except(AttributeError, IndexError):
-        stlib.SG_user = None
+    stlib.SG_user = greenlet.value
+
+    if not stlib.SG_user:
         stlib.logger.error('SteamGifts login status: Cookies not found' +
                            '\nPlease, check if you are logged in on' +
                            '\nwww.steamgifts.com')
 
 
 def check_steamtrades_login(greenlet):
-    try:
-        html = bs4.BeautifulSoup(greenlet.value.content, 'html.parser')
-        avatar = html.find('a', class_='nav_avatar')
+    stlib.ST_user = greenlet.value
 
-        if not avatar:
-            raise AttributeError
-
-        user_id = avatar['href'].split('/')[2]
-        # FIXME: get username from steamapi
-        stlib.ST_user = user_id
-    except(AttributeError, IndexError):
-        stlib.ST_user = None
+    if not stlib.ST_user:
         stlib.logger.error('SteamTrades login status: Cookies not found' +
                            '\nPlease, check if you are logged in on' +
                            '\nwww.steamtrades.com')
 
 
 def check_steamcompanion_login(greenlet):
-    try:
-        html = bs4.BeautifulSoup(greenlet.value.content, 'html.parser')
-        user = html.find('div', class_='profile').find('a').text.strip()
+    stlib.SC_user = greenlet.value
 
-        if not user:
-            raise AttributeError
-
-        stlib.SC_user = user
-    except(AttributeError, IndexError):
-        stlib.SC_user = None
+    if not stlib.SC_user:
         stlib.logger.error('SteamCompanion login status: Cookies not found' +
                            '\nPlease, check if you are logged in on' +
                            '\nsteamcompanion.com')
 
 
-def queue_connect(service_name, callback=None, wait=False):
-    if not callback:
-        callback = eval(''.join(['check_', service_name, '_login']))
+def __task_finished(greenlet):
+    # Linked last, so all callbacks of the task already ran
+    tasks.discard(greenlet)
+    task_counters['finished'] += 1
+    tasks_changed.set()
+    ui.wakeup_main_loop()
 
-    url = eval(''.join(['stlib.', service_name, '_check_page']))
 
-    greenlet = gevent.Greenlet(stlib.network.try_get_response, service_name, url)
-    greenlet.link(callback)
+def spawn_task(function, *args, callback=None):
+    greenlet = gevent.Greenlet(function, *args)
+
+    if callback:
+        greenlet.link(callback)
+
+    greenlet.link(__task_finished)
+    tasks.add(greenlet)
+    task_counters['started'] += 1
     greenlet.start()
 
+    return greenlet
+
+
+def kill_tasks(greenlets=None):
+    for greenlet in list(greenlets or tasks):
+        if not greenlet.ready():
+            task_counters['killed'] += 1
+
+        greenlet.kill(block=False)
+
+
+def get_task_counters():
+    return dict(task_counters, active=len(tasks))
+
+
+def queue_connect(service_name, callback=None, wait=False, use_cache=True):
+    if not callback:
+        callback = eval(''.join(['check_', service_name, '_login']))
+
+    greenlet = spawn_task(get_user, service_name, use_cache, callback=callback)
+
     if wait:
-        try:
-            greenlet.join()
-        except KeyboardInterrupt:
-            sys.exit(0)
+        wait_queue([greenlet])
 
     return greenlet
 
 
 def get_queue():
-    greenlets = []
-
-    for object_ in gc.get_objects():
-        if isinstance(object_, gevent.Greenlet):
-            greenlets.append(object_)
-
-    return greenlets
+    return list(tasks)
 
 
 def wait_queue(greenlets=None):
     if not greenlets:
         greenlets = get_queue()
 
+    def finished():
+        return tasks.isdisjoint(greenlets)
+
     try:
-        while True:
+        if stlib.gui_mode:
+            ui.wait_main_loop(lambda: finished() or not ui.main_window.get_window())
+
             # Kill all greenlets before exit
             if not ui.main_window.get_window():
                 raise SystemExit
+        else:
+            while True:
+                tasks_changed.clear()
 
-            try:
-                if greenlets[-1].ready():
-                    greenlets.pop()
+                if finished():
+                    break
 
-                ui.update_main_loop()
-            except IndexError:
-                break
+                tasks_changed.wait()
     except(KeyboardInterrupt, SystemExit):
-        for greenlet in greenlets:
-            greenlet.kill()
-
+        kill_tasks(greenlets)
         sys.exit(0)
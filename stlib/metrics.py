@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import gevent.monkey
+
+# NEVER import full stlib module here!!! (cyclic)
+from stlib import config as stconfig
+
+
+def __get_module_name():
+    # Console modules are started with -c / --cli <module>
+    for index, arg in enumerate(sys.argv[1:-1], 1):
+        if arg in ['-c', '--cli']:
+            return sys.argv[index + 1]
+
+    if '--mock-server' in sys.argv:
+        return 'mock-server'
+
+    return 'gui'
+
+
+# One file for each module, so instances running together don't overwrite
+# each other. [Debug] metricsFile is for more instances of the same module
+metrics_file_name = '{}-{}.prom'.format(os.path.splitext(os.path.basename(stconfig.config_file_path))[0],
+                                        __get_module_name())
+metrics_file_path = stconfig.get('Debug', 'metricsFile',
+                                 fallback=os.path.join(os.path.dirname(stconfig.config_file_path), metrics_file_name))
+
+# Upper bounds, in seconds, of the latency histograms
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# {name: (type, {labels: value})}. Histogram values are [buckets, sum, count]
+metrics = {}
+last_snapshot = time.time()
+# Metrics are updated by the workers, which are real threads
+lock = gevent.monkey.get_original('threading', 'Lock')()
+snapshot_lock = gevent.monkey.get_original('threading', 'Lock')()
+
+# Handlers are set by stlib.logging when the event log is enabled
+events_logger = logging.getLogger('SteamTools.events')
+events_logger.propagate = False
+
+
+def __get_labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with lock:
+        values = metrics.setdefault(name, ('counter', {}))[1]
+        labels = __get_labels(labels)
+        values[labels] = values.get(labels, 0) + value
+
+    update_snapshot()
+
+
+def observe(name, value, **labels):
+    with lock:
+        values = metrics.setdefault(name, ('histogram', {}))[1]
+        histogram = values.setdefault(__get_labels(labels), [[0] * len(BUCKETS), 0, 0])
+
+        for index, bucket in enumerate(BUCKETS):
+            if value <= bucket:
+                histogram[0][index] += 1
+
+        histogram[1] += value
+        histogram[2] += 1
+
+    update_snapshot()
+
+
+def event(name, **fields):
+    if not events_logger.isEnabledFor(logging.INFO):
+        return None
+
+    fields.update(event=name, time=round(time.time(), 3))
+    events_logger.info(json.dumps(fields, sort_keys=True))
+
+
+def get_url_class(url):
+    # Host and first path segment. e.g.: steamcommunity.com/id
+    url_parts = urllib.parse.urlsplit(url)
+    return '{}/{}'.format(url_parts.netloc, url_parts.path.strip('/').split('/', 1)[0])
+
+
+def record_request(service_name, url, status, size, latency):
+    url_class = get_url_class(url)
+
+    # Requests without cookies (e.g.: badge prices) are labeled by host
+    if not service_name:
+        service_name = urllib.parse.urlsplit(url).netloc
+
+    inc('requests_total', service=service_name, status=status)
+    inc('response_bytes_total', size, service=service_name)
+    observe('request_duration_seconds', latency, service=service_name)
+
+    event('request',
+          service=service_name,
+          url_class=url_class,
+          status=status,
+          bytes=size,
+          latency=round(latency, 4))
+
+
+def __format_labels(labels, *extra):
+    labels = list(labels) + list(extra)
+
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(key, value.replace('"', '\\"')) for key, value in labels) + '}'
+
+
+def get_snapshot():
+    lines = []
+
+    with lock:
+        for name, (type_, values) in sorted(metrics.items()):
+            name = 'steamtools_' + name
+            lines.append('# TYPE {} {}'.format(name, type_))
+
+            for labels, value in sorted(values.items()):
+                if type_ == 'counter':
+                    lines.append('{}{} {}'.format(name, __format_labels(labels), value))
+                    continue
+
+                buckets, sum_, count = value
+
+                for bucket, bucket_count in zip(BUCKETS, buckets):
+                    lines.append('{}_bucket{} {}'.format(name, __format_labels(labels, ('le', str(bucket))),
+                                                         bucket_count))
+
+                lines.append('{}_bucket{} {}'.format(name, __format_labels(labels, ('le', '+Inf')), count))
+                lines.append('{}_sum{} {}'.format(name, __format_labels(labels), sum_))
+                lines.append('{}_count{} {}'.format(name, __format_labels(labels), count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_snapshot():
+    global last_snapshot
+
+    last_snapshot = time.time()
+
+    if not stconfig.getboolean('Debug', 'metricsSnapshot', fallback=True):
+        return None
+
+    with snapshot_lock:
+        # Unique, so other instances writing the same file never share it
+        temp_file, temp_file_path = tempfile.mkstemp(suffix='.tmp',
+                                                     prefix=os.path.basename(metrics_file_path),
+                                                     dir=os.path.dirname(metrics_file_path))
+
+        try:
+            with os.fdopen(temp_file, 'w') as metrics_file:
+                metrics_file.write(get_snapshot())
+
+            # mkstemp makes it private, but scrapers run as other users
+            os.chmod(temp_file_path, 0o644)
+            # Scrapers never see a half written file
+            os.replace(temp_file_path, metrics_file_path)
+        except OSError:
+            os.remove(temp_file_path)
+            raise
+
+
+def update_snapshot():
+    if time.time() - last_snapshot >= stconfig.getint('Debug', 'metricsInterval', fallback=60):
+        write_snapshot()
@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+# Local stand-in for Steam, SteamCardExchange, SteamGifts and SteamTrades.
+# All services share the same host, requests are routed by path:
+#
+#   /login/checkstoredlogin/?redirectURL=...   steam login, badges and gamecards
+#   /ITwoFactorService/QueryTime/v1            server time
+#   /mobileconf/conf, /mobileconf/ajaxop       mobile confirmations
+#   /index.php?badgeprices                     badge prices
+#   /giveaways/search, /giveaway/<code>/...    giveaways
+#   /account/profile/sync                      steamgifts login
+#   /account/settings/giveaways                steamgifts settings
+#   /trade/<id>/..., /trades                   trades
+#   /legal/privacy-policy                      steamtrades login
+#   /ajax.php                                  entry_insert and trade_bump
+#
+# Pages that need a login are served logged out to requests without cookies.
+# Point steam tools to it with STEAM_TOOLS_BASE_URL or [Network] baseUrl.
+
+import hashlib
+import http.server
+import json
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+import stlib
+
+# Frozen builds have the library in a zip and the data files next to the executable
+if hasattr(sys, "frozen"):
+    FIXTURES_PATH = os.path.join(os.path.dirname(sys.executable), 'stlib', 'mock_fixtures')
+else:
+    FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_fixtures')
+
+USER = 'mockuser'
+USER_ID = '76561190000000000'
+XSRF_TOKEN = '0123456789abcdef0123456789abcdef'
+
+fixtures = {}
+state = {}
+# {service: [tokens, last update]}
+rate_limits = {}
+lock = threading.Lock()
+
+
+def load_fixtures():
+    for file_name in os.listdir(FIXTURES_PATH):
+        with open(os.path.join(FIXTURES_PATH, file_name), encoding='utf-8') as fixture_file:
+            fixtures[file_name] = fixture_file.read()
+
+
+def get_game_name(game_id):
+    return 'Mock Game {}'.format(game_id)
+
+
+def get_slug(name):
+    return name.lower().replace(' ', '-')
+
+
+def get_giveaway_code(index):
+    return hashlib.md5(str(index).encode('utf-8')).hexdigest()[:5]
+
+
+def build_state():
+    config_parser = stlib.config.read()
+    badge_count = config_parser.getint('MockServer', 'badges', fallback=750)
+    price_rows = config_parser.getint('MockServer', 'priceRows', fallback=30000)
+    giveaway_pages = config_parser.getint('MockServer', 'giveawayPages', fallback=3)
+    confirmations = config_parser.getint('MockServer', 'confirmations', fallback=3)
+    randomizer = random.Random(0)
+
+    state['badges'] = []
+    state['prices'] = []
+    state['giveaways'] = []
+    state['confirmations'] = []
+    state['bumps'] = {}
+    state['points'] = config_parser.getint('MockServer', 'points', fallback=400)
+    state['per_page'] = config_parser.getint('MockServer', 'badgesPerPage', fallback=150)
+
+    for game_id in range(price_rows):
+        state['prices'].append((game_id, randomizer.randint(5, 15), randomizer.uniform(0.1, 20)))
+
+    for game_id in randomizer.sample(range(price_rows), min(badge_count, price_rows)):
+        drops = randomizer.choice([0, 0, 0, 1, 2, 3, 4])
+        state['badges'].append((game_id, drops, randomizer.randint(0, 300)))
+
+    for index in range(giveaway_pages * 50 + 3):
+        state['giveaways'].append({'code': get_giveaway_code(index),
+                                   'game_id': randomizer.randint(10000, 500000),
+                                   'points': randomizer.randint(1, 50),
+                                   'copies': randomizer.choice([1, 1, 1, 1, 2, 5]),
+                                   'entries': randomizer.randint(0, 5000),
+                                   'level': randomizer.randint(0, 5),
+                                   'faded': randomizer.random() < 0.1})
+
+    for trade_id in range(confirmations):
+        state['confirmations'].append((str(1000000 + trade_id), str(randomizer.getrandbits(64))))
+
+
+def format_drops(drops):
+    if drops:
+        return '{} card drops remaining'.format(drops)
+    else:
+        return 'No card drops remaining'
+
+
+def get_badges_page(page):
+    per_page = state['per_page']
+    page_count = max(1, -(-len(state['badges']) // per_page))
+    badges = []
+
+    for game_id, drops, hours in state['badges'][(page - 1) * per_page:page * per_page]:
+        badges.append(fixtures['badge_row.html'].format(user=USER,
+                                                        game_id=game_id,
+                                                        game_name=get_game_name(game_id),
+                                                        hours=hours,
+                                                        cards=drops + 5,
+                                                        drops=format_drops(drops)))
+
+    page_links = ''.join(fixtures['page_link.html'].format(page=page_) for page_ in range(1, page_count + 1))
+
+    return fixtures['badges.html'].format(user=USER, badges=''.join(badges), page_links=page_links)
+
+
+def get_gamecards_page(game_id):
+    for game_id_, drops, hours in state['badges']:
+        if str(game_id_) == game_id:
+            break
+    else:
+        return None
+
+    card_items = ''.join(fixtures['card_item.html'].format(card=card, cards=drops + 5) for card in range(drops + 5))
+
+    return fixtures['gamecards.html'].format(user=USER,
+                                             game_name=get_game_name(game_id),
+                                             hours=hours,
+                                             cards=drops + 5,
+                                             drops=format_drops(drops),
+                                             card_items=card_items)
+
+
+def get_prices_page():
+    rows = [fixtures['badge_price_row.html'].format(game_id=game_id,
+                                                    game_name=get_game_name(game_id),
+                                                    cards=cards,
+                                                    price=price)
+            for game_id, cards, price in state['prices']]
+
+    return fixtures['badge_prices.html'].format(rows=''.join(rows))
+
+
+def format_giveaway(giveaway):
+    game_name = get_game_name(giveaway['game_id'])
+
+    if giveaway['copies'] > 1:
+        copies = fixtures['giveaway_copies.html'].format(copies=giveaway['copies'])
+    else:
+        copies = ''
+
+    return fixtures['giveaway_row.html'].format(code=giveaway['code'],
+                                                slug=get_slug(game_name),
+                                                game_id=giveaway['game_id'],
+                                                game_name=game_name,
+                                                copies=copies,
+                                                points=giveaway['points'],
+                                                entries='{:,}'.format(giveaway['entries']),
+                                                comments=giveaway['entries'] // 100,
+                                                level=giveaway['level'],
+                                                faded=' is-faded' if giveaway['faded'] else '',
+                                                hours=giveaway['level'] + 1,
+                                                timestamp=int(time.time()) + 3600)
+
+
+def get_giveaways_page(giveaway_type, page):
+    # The three first giveaways are pinned. Wishlist and new
+    # share part of their giveaways with the main listing.
+    pool = state['giveaways'][3:]
+
+    if giveaway_type == 'wishlist':
+        pool = pool[::3]
+    elif giveaway_type == 'new':
+        pool = pool[len(pool) // 2:] + pool[:len(pool) // 2]
+
+    giveaways = pool[(page - 1) * 50:page * 50]
+    pinned = state['giveaways'][:3] if page == 1 else []
+
+    return fixtures['giveaways.html'].format(points=state['points'],
+                                             level=3,
+                                             user=USER,
+                                             pinned=''.join(format_giveaway(giveaway) for giveaway in pinned),
+                                             giveaways=''.join(format_giveaway(giveaway) for giveaway in giveaways),
+                                             first=(page - 1) * 50 + 1,
+                                             last=(page - 1) * 50 + len(giveaways))
+
+
+def get_giveaway(code):
+    for giveaway in state['giveaways']:
+        if giveaway['code'] == code:
+            return giveaway
+
+    return None
+
+
+def get_giveaway_page(code):
+    giveaway = get_giveaway(code)
+
+    if not giveaway:
+        return None
+
+    return fixtures['giveaway.html'].format(game_name=get_game_name(giveaway['game_id']),
+                                            points=state['points'],
+                                            xsrf_token=XSRF_TOKEN,
+                                            code=code,
+                                            giveaway_points=giveaway['points'])
+
+
+def enter_giveaway(code):
+    giveaway = get_giveaway(code)
+
+    with lock:
+        if not giveaway or giveaway['faded'] or giveaway['points'] > state['points']:
+            return json.loads(fixtures['entry_insert_error.json'])
+
+        giveaway['faded'] = True
+        state['points'] -= giveaway['points']
+        result = json.loads(fixtures['entry_insert.json'])
+        result['points'] = str(state['points'])
+
+    return result
+
+
+def get_trade_title(trade_id):
+    return 'Mock trade {}'.format(trade_id)
+
+
+def get_trade_page(trade_id):
+    return fixtures['trade.html'].format(title=get_trade_title(trade_id),
+                                         user_id=USER_ID,
+                                         xsrf_token=XSRF_TOKEN,
+                                         trade_id=trade_id)
+
+
+def get_trades_page():
+    with lock:
+        trade_ids = sorted(state['bumps'], key=state['bumps'].get, reverse=True)
+
+    trades = [fixtures['trade_row.html'].format(trade_id=trade_id,
+                                                slug=get_slug(get_trade_title(trade_id)),
+                                                title=get_trade_title(trade_id))
+              for trade_id in trade_ids]
+
+    return fixtures['trades.html'].format(user_id=USER_ID, trades=''.join(trades))
+
+
+def bump_trade(trade_id):
+    with lock:
+        last_bump = state['bumps'].get(trade_id)
+
+        if last_bump and time.time() - last_bump < 3600:
+            return json.loads(fixtures['trade_bump_wait.json'])
+
+        state['bumps'][trade_id] = time.time()
+
+    return json.loads(fixtures['trade_bump.json'])
+
+
+def get_server_time():
+    query_time = json.loads(fixtures['query_time.json'])
+    query_time['response']['server_time'] = str(int(time.time()))
+
+    return query_time
+
+
+def get_confirmations_page():
+    with lock:
+        confirmations = list(state['confirmations'])
+
+    entries = [fixtures['mobileconf_entry.html'].format(trade_id=trade_id,
+                                                        trade_key=trade_key,
+                                                        creator=USER_ID,
+                                                        partner='Mock partner {}'.format(trade_id),
+                                                        items='You will give up your Mock Card')
+               for trade_id, trade_key in confirmations]
+
+    return fixtures['mobileconf.html'].format(confirmations=''.join(entries))
+
+
+def finalize_confirmation(trade_id, trade_key):
+    with lock:
+        if (trade_id, trade_key) not in state['confirmations']:
+            return {'success': False}
+
+        state['confirmations'].remove((trade_id, trade_key))
+
+    return json.loads(fixtures['mobileconf_ajaxop.json'])
+
+
+def get_service(path, post_data=None):
+    if path[:1] in [['login'], ['mobileconf']]:
+        return 'steam'
+    elif path[:1] == ['ITwoFactorService']:
+        return 'steamapi'
+    elif path == ['index.php']:
+        return 'steamcardexchange'
+    elif path[:1] in [['giveaways'], ['giveaway'], ['account']]:
+        return 'steamgifts'
+    elif path == ['ajax.php'] and post_data and post_data.get('do') == ['entry_insert']:
+        return 'steamgifts'
+    else:
+        return 'steamtrades'
+
+
+def is_login_required(path, post_data=None):
+    if path[:1] in [['login'], ['mobileconf'], ['account']] or path == ['legal', 'privacy-policy']:
+        return True
+
+    return path == ['ajax.php'] and bool(post_data)
+
+
+def is_rate_limited(service):
+    config_parser = stlib.config.read()
+    requests_per_second = config_parser.getfloat('MockServer', 'rateLimit', fallback=0)
+    burst = config_parser.getint('MockServer', 'rateBurst', fallback=10)
+
+    if requests_per_second <= 0:
+        return False
+
+    with lock:
+        now = time.time()
+        tokens, last_update = rate_limits.get(service, (burst, now))
+        tokens = min(burst, tokens + (now - last_update) * requests_per_second)
+
+        if tokens < 1:
+            rate_limits[service] = (tokens, now)
+            return True
+
+        rate_limits[service] = (tokens - 1, now)
+
+    return False
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format_, *args):
+        stlib.logger.verbose('Mock server: ' + format_, *args)
+
+    def send_content(self, content, content_type='text/html; charset=utf-8', etag=None, status=200):
+        if content is None:
+            return self.send_error(404)
+
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        content = content.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+
+        if etag:
+            self.send_header('ETag', etag)
+
+        if status == 429:
+            self.send_header('Retry-After', '1')
+
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_json(self, data, status=200):
+        self.send_content(json.dumps(data), 'application/json', status=status)
+
+    def send_redirect(self, path):
+        self.send_response(301)
+        self.send_header('Location', path)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def is_failed(self, path, post_data=None):
+        config_parser = stlib.config.read()
+        latency = config_parser.getfloat('MockServer', 'latency', fallback=0.2)
+        jitter = config_parser.getfloat('MockServer', 'latencyJitter', fallback=0.1)
+        error_rate = config_parser.getfloat('MockServer', 'errorRate', fallback=0)
+
+        time.sleep(max(0, random.uniform(latency - jitter, latency + jitter)))
+
+        if is_rate_limited(get_service(path, post_data)):
+            self.send_json(json.loads(fixtures['rate_limited.json']), 429)
+            return True
+
+        if random.random() < error_rate:
+            self.send_error(503)
+            return True
+
+        return False
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = [part for part in url.path.split('/') if part]
+        query = urllib.parse.parse_qs(url.query)
+
+        if self.is_failed(path):
+            return None
+
+        # Like the real ones, pages of a logged out user have only a login link
+        if is_login_required(path) and not self.headers.get('Cookie'):
+            self.send_content(fixtures['{}_logged_out.html'.format(get_service(path))])
+        elif path[:2] == ['login', 'checkstoredlogin']:
+            # redirectURL=id/<user>/badges/?p=<page> is not quoted
+            redirect_url = urllib.parse.urlsplit(url.query.partition('=')[2])
+            redirect_path = [part for part in redirect_url.path.split('/') if part]
+
+            if redirect_path[-1:] == ['badges']:
+                page = int(urllib.parse.parse_qs(redirect_url.query).get('p', ['1'])[0])
+                self.send_content(get_badges_page(page), etag='"badges-{}"'.format(page))
+            elif redirect_path[-2:-1] == ['gamecards']:
+                self.send_content(get_gamecards_page(redirect_path[-1]))
+            else:
+                self.send_content(fixtures['steam_login.html'].format(user=USER))
+        elif path == ['mobileconf', 'conf']:
+            self.send_content(get_confirmations_page())
+        elif path == ['mobileconf', 'ajaxop']:
+            self.send_json(finalize_confirmation(query.get('cid', [''])[0], query.get('ck', [''])[0]))
+        elif path == ['index.php'] and url.query == 'badgeprices':
+            self.send_content(get_prices_page(), etag='"badgeprices"')
+        elif path == ['giveaways', 'search']:
+            page = int(query.get('page', ['1'])[0])
+            self.send_content(get_giveaways_page(query.get('type', ['main'])[0], page))
+        elif path[:1] == ['giveaway'] and len(path) > 1:
+            self.send_content(get_giveaway_page(path[1]))
+        elif path == ['account', 'profile', 'sync']:
+            self.send_content(fixtures['steamgifts_login.html'].format(points=state['points'],
+                                                                       xsrf_token=XSRF_TOKEN,
+                                                                       user=USER))
+        elif path == ['account', 'settings', 'giveaways']:
+            self.send_content(fixtures['giveaway_settings.html'].format(xsrf_token=XSRF_TOKEN))
+        elif path[:1] == ['trade'] and len(path) == 2:
+            # Like the real one, the trade page is always redirected to its title
+            self.send_redirect('/trade/{}/{}'.format(path[1], get_slug(get_trade_title(path[1]))))
+        elif path[:1] == ['trade'] and len(path) == 3:
+            self.send_content(get_trade_page(path[1]))
+        elif path == ['trades']:
+            self.send_content(get_trades_page())
+        elif path == ['legal', 'privacy-policy']:
+            self.send_content(fixtures['steamtrades_login.html'].format(user_id=USER_ID))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        path = [part for part in urllib.parse.urlsplit(self.path).path.split('/') if part]
+        length = int(self.headers.get('Content-Length', 0))
+        post_data = urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8'))
+        action = post_data.get('do', [''])[0]
+
+        if self.is_failed(path, post_data):
+            return None
+
+        if is_login_required(path, post_data) and not self.headers.get('Cookie'):
+            self.send_json({'type': 'error', 'msg': 'You must be logged in'})
+        elif path == ['ITwoFactorService', 'QueryTime', 'v1']:
+            self.send_json(get_server_time())
+        elif path == ['account', 'settings', 'giveaways']:
+            self.send_redirect(self.path)
+        elif path != ['ajax.php']:
+            self.send_error(404)
+        elif action == 'entry_insert':
+            self.send_json(enter_giveaway(post_data['code'][0]))
+        elif action == 'trade_bump':
+            self.send_json(bump_trade(post_data['code'][0]))
+        else:
+            self.send_json({'type': 'error', 'msg': 'Unknown action'})
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def run():
+    config_parser = stlib.config.read()
+    address = config_parser.get('MockServer', 'address', fallback='127.0.0.1')
+    port = config_parser.getint('MockServer', 'port', fallback=8765)
+
+    load_fixtures()
+    build_state()
+
+    server = Server((address, port), RequestHandler)
+    base_url = 'http://{}:{}'.format(*server.server_address)
+
+    stlib.logging.console_msg('Mock server listening on {}'.format(base_url))
+    stlib.logging.console_msg('Use it with STEAM_TOOLS_BASE_URL={} or [Network] baseUrl'.format(base_url))
+    stlib.logging.console_msg('Any value in the [<service>Cookies] sections is accepted')
+    stlib.logging.console_msg('Requests without cookies get the pages of a logged out user')
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
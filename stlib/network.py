@@ -19,8 +19,10 @@
 import sys
 import threading
 import time
+import urllib.parse
 
-import bs4
+import gevent.monkey
+import gevent.threadpool
 import requests
 
 import stlib
@@ -33,45 +35,237 @@ STEAM_LOGIN_PAGES = [
 
 USER_AGENT = {'User-Agent': 'Unknown/0.0.0'}
 
+SERVICES = ['steam', 'steamgifts', 'steamtrades', 'steamcompanion']
 
-class Threaded(threading.Thread):
-    def __init__(self, function, *args, **kwargs):
-        threading.Thread.__init__(self)
-        self.function = function
-        self.args = args
-        self.kwargs = kwargs
-        self.return_ = None
+# Sockets belong to the hub of the thread that created them, so each
+# worker has its own sessions. Keys are (service name, thread ident)
+sessions = {}
+bound_cookies = {}
+# All sessions of a thread share its connections. Keys are thread idents
+adapters = {}
+get_thread_ident = gevent.monkey.get_original('threading', 'get_ident')
 
-    def run(self):
-        self.return_ = self.function(*self.args, **self.kwargs)
+
+class Future:
+    def __init__(self):
+        self.result = None
+        self.finished = False
+
+    def done(self):
+        return self.finished
+
+    def get(self):
+        if stlib.gui_mode and ui.is_main_greenlet():
+            ui.wait_main_loop(self.done)
+
+        return self.result.get()
+
+
+class Executor:
+    def __init__(self, max_workers):
+        self.pool = gevent.threadpool.ThreadPool(max_workers)
+        self.local = threading.local()
+        # Results of finished workers not delivered by the hub yet
+        self.undelivered = 0
+        self.lock = gevent.monkey.get_original('threading', 'Lock')()
+
+    def is_worker(self):
+        return getattr(self.local, 'is_worker', False)
+
+    def submit(self, function, *args, **kwargs):
+        future = Future()
+        future.result = self.pool.spawn(self._run, future, function, args, kwargs)
+        future.result.rawlink(self._delivered)
+
+        return future
+
+    def _delivered(self, result):
+        with self.lock:
+            self.undelivered -= 1
+
+    def _run(self, future, function, args, kwargs):
+        self.local.is_worker = True
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            future.finished = True
+
+            with self.lock:
+                self.undelivered += 1
+
+            ui.wakeup_main_loop()
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_slot = {}
+        # Workers are real threads, so the gevent lock is not enough here
+        self.lock = gevent.monkey.get_original('threading', 'Lock')()
+
+    def wait(self, url):
+        if not self.interval:
+            return None
+
+        host = urllib.parse.urlsplit(url).netloc
+
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot.get(host, 0))
+            self.next_slot[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TokenBucket:
+    def __init__(self, tokens_per_second, capacity=1):
+        self.rate = tokens_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.time()
+        self.lock = gevent.monkey.get_original('threading', 'Lock')()
+
+    def take(self):
+        if self.rate <= 0:
+            return None
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_update) * self.rate)
+            self.last_update = now
+            # A negative value reserves a token that will only exist in the future
+            self.tokens -= 1
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait_time:
+            time.sleep(wait_time)
+
+
+executor = None
+rate_limiter = None
+
+
+def has_undelivered_results():
+    return executor is not None and executor.undelivered > 0
+
+
+def get_executor():
+    global executor
+
+    if not executor:
+        config_parser = stlib.config.read()
+        max_workers = config_parser.getint('Network', 'maxWorkers', fallback=8)
+        executor = Executor(max_workers)
+
+    return executor
+
+
+def get_rate_limiter():
+    global rate_limiter
+
+    if not rate_limiter:
+        config_parser = stlib.config.read()
+        requests_per_second = config_parser.getfloat('Network', 'hostRateLimit', fallback=4)
+        rate_limiter = RateLimiter(requests_per_second)
+
+    return rate_limiter
+
+
+def map_async(function, iterable, concurrency=4):
+    executor_ = get_executor()
+    futures = []
+
+    for item in iterable:
+        futures.append(executor_.submit(function, item))
+
+        if len(futures) >= concurrency:
+            yield futures.pop(0).get()
+
+    for future in futures:
+        yield future.get()
 
 
 # It's Magic!
 def async_wait(function):
     def async_call(*args, **kwargs):
-        thread = Threaded(function, *args, **kwargs)
-        thread.start()
+        executor_ = get_executor()
 
-        while thread.is_alive():
-            ui.update_main_loop()
-        else:
-            return thread.return_
+        # Already running in a worker, don't wait for ourselves
+        if executor_.is_worker():
+            return function(*args, **kwargs)
+
+        return executor_.submit(function, *args, **kwargs).get()
 
     return async_call
 
 
-def nonblocking_wait(seconds):
-    for _ in range(seconds * 10):
-        time.sleep(0.1)
-        ui.update_main_loop()
+def get_session(service_name=None):
+    session_key = (service_name, get_thread_ident())
+
+    try:
+        return sessions[session_key]
+    except KeyError:
+        pass
+
+    config_parser = stlib.config.read()
+    pool_size = config_parser.getint('Network', 'poolSize', fallback=10)
+    keep_alive = config_parser.getboolean('Network', 'keepAlive', fallback=True)
+
+    session = requests.Session()
+    session.headers.update(USER_AGENT)
+
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+
+    try:
+        adapter = adapters[session_key[1]]
+    except KeyError:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        adapters[session_key[1]] = adapter
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    sessions[session_key] = session
+
+    return session
+
+
+def bind_cookies(service_name, cookies):
+    session_key = (service_name, get_thread_ident())
+
+    if bound_cookies.get(session_key) == cookies:
+        return None
+
+    stlib.logger.verbose('Binding cookies for %s', service_name)
+    session = get_session(service_name)
+    session.cookies.clear()
+    requests.utils.add_dict_to_cookiejar(session.cookies, cookies)
+    bound_cookies[session_key] = dict(cookies)
+
+
+def close_sessions():
+    for session in list(sessions.values()):
+        session.close()
+
+    sessions.clear()
+    bound_cookies.clear()
+    adapters.clear()
 
 
 @async_wait
-def get_response(url, data=None, cookies=None, headers=USER_AGENT, timeout=10, verify=True, stream=False, empty_post=False):
+@stlib.profiler.timed('network.get_response')
+def get_response(url, data=None, cookies=None, headers=None, timeout=10, verify=True, stream=False, empty_post=False,
+                 service_name=None, service_cookies=None):
     response = None
 
-    if headers:
-        headers.update(USER_AGENT)
+    # Bound here, because this worker sends the request
+    if service_cookies:
+        bind_cookies(service_name, service_cookies)
+
+    session = get_session(service_name)
 
     kwargs = {'data': data,
               'headers': headers,
@@ -81,12 +275,17 @@ def get_response(url, data=None, cookies=None, headers=USER_AGENT, timeout=10, v
               'stream': stream}
 
     for i in range(1, 4):
+        get_rate_limiter().wait(url)
+        start_time = time.time()
+        status = 'error'
+
         try:
             if data or empty_post:
-                response = requests.post(url, **kwargs)
+                response = session.post(url, **kwargs)
             else:
-                response = requests.get(url, **kwargs)
+                response = session.get(url, **kwargs)
 
+            status = response.status_code
             response.raise_for_status()
         except requests.exceptions.SSLError:
             stlib.logger.critical('INSECURE CONNECTION DETECTED!')
@@ -102,13 +301,19 @@ def get_response(url, data=None, cookies=None, headers=USER_AGENT, timeout=10, v
                requests.exceptions.RequestException,
                requests.exceptions.Timeout):
             stlib.logger.error('Unable to connect. Trying again... ({}/3)'.format(i))
-            nonblocking_wait(3)
         else:
             return response
+        finally:
+            # Streamed responses are not read here
+            size = len(response.content) if status != 'error' and not stream else 0
+            stlib.metrics.record_request(service_name, url, status, size, time.time() - start_time)
+
+        time.sleep(3)
 
     return False
 
-def try_get_response(service_name, url, data=None):
+
+def try_get_response(service_name, url, data=None, headers=None):
     config_parser = stlib.config.read()
     auto_recovery = False
 
@@ -120,7 +325,7 @@ def try_get_response(service_name, url, data=None):
             if not cookies:
                 raise KeyError
 
-            response = get_response(url, data, cookies)
+            response = get_response(url, data, headers=headers, service_name=service_name, service_cookies=cookies)
 
             if response is None:
                 raise KeyError
@@ -154,16 +359,16 @@ def try_get_response(service_name, url, data=None):
             return response
 
 
-def get_html(*args, **kwargs):
+def get_html(*args, page_type=None, **kwargs):
     response = get_response(*args, **kwargs)
 
-    return bs4.BeautifulSoup(response.content, 'html.parser')
+    return stlib.extractor.parse(response.content, page_type)
 
 
-def try_get_html(*args, **kwargs):
+def try_get_html(*args, page_type=None, **kwargs):
     response = try_get_response(*args, **kwargs)
 
     if response:
-        return bs4.BeautifulSoup(response.content, 'html.parser')
+        return stlib.extractor.parse(response.content, page_type)
     else:
         return None
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+#
+# Lara Maia <dev@lara.click> 2015 ~ 2016
+#
+# The Steam Tools is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# The Steam Tools is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#
+
+import atexit
+import collections
+import functools
+import os
+import sys
+import tempfile
+import time
+
+import gevent.monkey
+
+# NEVER import full stlib module here!!! (cyclic)
+from stlib import config as stconfig
+from stlib import logging as stlogging
+
+enabled = False
+running = False
+
+# Collapsed stacks ('frame;frame;frame') and how many samples found them
+samples = collections.Counter()
+idle_samples = 0
+# {span name: [calls, total time, max time]}
+spans = {}
+
+# The sampler and the workers are real threads
+lock = gevent.monkey.get_original('threading', 'Lock')()
+get_thread_ident = gevent.monkey.get_original('threading', 'get_ident')
+main_thread_ident = get_thread_ident()
+sleep = gevent.monkey.get_original('time', 'sleep')
+
+
+# Innermost frames of threads waiting for something to do
+IDLE_FRAMES = [('hub.py', 'run'),  # gevent hub waiting for events
+               ('_threading.py', 'get'),  # pool worker waiting for a task
+               ('_threading.py', 'wait'),
+               ('_threading.py', 'acquire_with_timeout'),
+               ('logging.py', '_run'),  # log writer sleeping between batches
+               ('__init__.py', 'wait_main_loop')]  # gtk waiting for events
+
+
+def get_output_path():
+    file_name = 'profile_' + os.path.splitext(os.path.basename(sys.argv[0]))[0] + '.collapsed'
+    default_path = os.path.join(tempfile.gettempdir(), 'steam-tools', file_name)
+
+    return stconfig.get('Debug', 'profileFile', fallback=default_path)
+
+
+def __get_stack(frame):
+    stack = []
+
+    while frame:
+        code = frame.f_code
+        stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+
+    return ';'.join(reversed(stack))
+
+
+def __is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def __sampler(interval, wall_clock):
+    global idle_samples
+
+    sampler_ident = get_thread_ident()
+
+    while running:
+        # Only the running greenlet of each thread is here. The others
+        # are sleeping, so they are not using any cpu time anyway
+        for thread_ident, frame in sys._current_frames().items():
+            if thread_ident == sampler_ident:
+                continue
+
+            # Blocked threads would hide the stacks using the cpu
+            if not wall_clock and __is_idle(frame):
+                with lock:
+                    idle_samples += 1
+
+                continue
+
+            thread_name = 'main' if thread_ident == main_thread_ident else 'worker'
+            stack = '{};{}'.format(thread_name, __get_stack(frame))
+
+            with lock:
+                samples[stack] += 1
+
+        sleep(interval)
+
+
+def start():
+    global enabled, running
+
+    if running:
+        return None
+
+    enabled = True
+    running = True
+    interval = stconfig.getfloat('Debug', 'profileInterval', fallback=0.005)
+    # Keep the waiting threads too, for a wall clock profile
+    wall_clock = stconfig.getboolean('Debug', 'profileWallClock', fallback=False)
+
+    gevent.monkey.get_original('_thread', 'start_new_thread')(__sampler, (interval, wall_clock))
+    atexit.register(stop)
+
+
+def stop():
+    global running
+
+    if not running:
+        return None
+
+    running = False
+    write_samples()
+    print_summary()
+
+
+def write_samples():
+    output_path = get_output_path()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    with lock:
+        lines = ['{} {}'.format(stack, count) for stack, count in samples.most_common()]
+
+    with open(output_path, 'w') as output_file:
+        output_file.write('\n'.join(lines) + '\n')
+
+    stlogging.console_msg('{} samples written to {} ({} idle samples skipped)'.format(sum(samples.values()),
+                                                                                      output_path,
+                                                                                      idle_samples))
+
+
+def print_summary():
+    stlogging.console_msg('{:40s} {:>8s} {:>10s} {:>10s} {:>10s}'.format('span', 'calls', 'total s', 'mean ms', 'max ms'))
+
+    with lock:
+        rows = sorted(spans.items(), key=lambda item: item[1][1], reverse=True)
+
+    for name, (calls, total_time, max_time) in rows:
+        stlogging.console_msg('{:40s} {:8d} {:10.3f} {:10.2f} {:10.2f}'.format(name,
+                                                                              calls,
+                                                                              total_time,
+                                                                              total_time / calls * 1000,
+                                                                              max_time * 1000))
+
+
+def add_span(name, elapsed_time):
+    with lock:
+        span = spans.setdefault(name, [0, 0, 0])
+        span[0] += 1
+        span[1] += elapsed_time
+        span[2] = max(span[2], elapsed_time)
+
+
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def timed_call(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            start_time = time.perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                add_span(name, time.perf_counter() - start_time)
+
+        return timed_call
+
+    return decorator
@@ -18,7 +18,12 @@
 
 import stlib
 
-giveaway_type = None
+giveaway_plan = None
+entry_limiter = None
+# Points known locally. None means it must be synced from the server
+user_points = None
+# Codes of the giveaways already joined, loaded from the cache
+entered_giveaways = None
 
 
 def type_generator(type_list):
@@ -27,7 +32,7 @@ def type_generator(type_list):
 
 
 def configure():
-    config_url = 'https://www.steamgifts.com/account/settings/giveaways'
+    config_url = '{}/account/settings/giveaways'.format(stlib.steamgifts_url)
     html = stlib.network.try_get_html('steamgifts', config_url)
     form = html.find('form')
     data = dict([(inputs['name'], inputs['value']) for inputs in form.findAll('input')])
@@ -42,14 +47,80 @@ def configure():
     return None
 
 
+def get_query_url(giveaway_type, page=1):
+    query_url = '{}?type='.format(stlib.steamgifts_query_page)
+
+    if giveaway_type == 'wishlist':
+        query_url += 'wishlist'
+    elif giveaway_type == 'new':
+        query_url += 'new'
+    elif giveaway_type == 'main':
+        pass
+    else:
+        query_url += '&q={}'.format(giveaway_type)
+
+    if page > 1:
+        query_url += '&page={}'.format(page)
+
+    return query_url
+
+
 def get_user_points(html=None):
     if not html:
-        html = stlib.network.try_get_html('steamgifts', stlib.steamgifts_check_page)
+        response = stlib.network.try_get_response('steamgifts', stlib.steamgifts_check_page)
+
+        if not response:
+            return None
+
+        try:
+            return int(stlib.extractor.extract(response.content, 'steamgifts')['points'])
+        except(TypeError, ValueError):
+            return None
 
     points = html.find('span', class_="nav__points")
     return int(points.text)
 
 
+def seed_points(html):
+    global user_points
+
+    user_points = get_user_points(html)
+    return user_points
+
+
+def debit_points(points):
+    global user_points
+
+    if user_points is not None:
+        user_points -= points
+
+
+def invalidate_points():
+    global user_points
+
+    user_points = None
+
+
+def set_points(points):
+    global user_points
+
+    user_points = points
+
+
+def get_points():
+    global user_points
+
+    if user_points is None:
+        stlib.logger.verbose('Syncing points from server')
+        user_points = get_user_points()
+
+        # Left unset, so the next call tries again
+        if user_points is None:
+            stlib.logger.error('Unable to sync points from server')
+
+    return user_points
+
+
 def get_user_level(html):
     level = html.find('span', class_=None)
     return int(''.join(filter(str.isdigit, level)))
@@ -91,6 +162,11 @@ def get_giveaway_query(giveaway):
     return head['href']
 
 
+def get_giveaway_code(giveaway):
+    # /giveaway/<code>/<game name>
+    return get_giveaway_query(giveaway).split('/')[2]
+
+
 def get_giveaway_copies(giveaway):
     head = giveaway.find('span', class_='giveaway__heading__thin')
 
@@ -114,6 +190,16 @@ def get_giveaway_points(giveaway):
     return int(points)
 
 
+def get_giveaway_entries(giveaway):
+    try:
+        links = giveaway.find('div', class_='giveaway__links')
+        entries = ''.join(filter(str.isdigit, links.find('span').text))
+    except AttributeError:
+        entries = 0
+
+    return int(entries or 0)
+
+
 def get_giveaway_level(giveaway):
     try:
         level_column = giveaway.find('div', class_='giveaway__column--contributor-level')
@@ -124,32 +210,215 @@ def get_giveaway_level(giveaway):
     return int(level)
 
 
-def join(giveaway):
+def get_giveaway_value(giveaway):
+    # Chance of winning any of the copies
+    return get_giveaway_copies(giveaway) / (get_giveaway_entries(giveaway) + 1)
+
+
+def get_entered_giveaways():
+    global entered_giveaways
+
+    if entered_giveaways is None:
+        config_parser = stlib.config.read()
+        max_age = config_parser.getint('SteamGifts', 'enteredGiveawaysTTL', fallback=60 * 60 * 24 * 60)
+        stlib.cache.prune_entered_giveaways(stlib.SG_user, max_age)
+        entered_giveaways = stlib.cache.get_entered_giveaways(stlib.SG_user)
+
+    return entered_giveaways
+
+
+def add_entered_giveaways(codes):
+    codes = set(codes) - get_entered_giveaways()
+
+    if codes:
+        entered_giveaways.update(codes)
+        stlib.cache.add_entered_giveaways(stlib.SG_user, codes)
+
+
+def get_candidates(type_list, developer_giveaways=True):
+    config_parser = stlib.config.read()
+    max_pages = config_parser.getint('SteamGifts', 'maxPages', fallback=3)
+    concurrency = config_parser.getint('SteamGifts', 'maxConcurrentPages', fallback=4)
+
+    query_pages = [(giveaway_type, page) for giveaway_type in type_list for page in range(1, max_pages + 1)]
+    entered = get_entered_giveaways()
+    candidates = {}
+    faded_codes = []
+    last_html = None
+
+    def fetch(query_page):
+        return query_page[1], stlib.network.try_get_html('steamgifts', get_query_url(*query_page), page_type='giveaways')
+
+    for page, html in stlib.network.map_async(fetch, query_pages, concurrency):
+        try:
+            giveaways = list(get_giveaways(html))
+        except AttributeError:
+            # No html or no more pages
+            continue
+
+        last_html = html
+
+        # Developer giveaways are pinned only in the first page
+        if developer_giveaways and page == 1:
+            giveaways.extend(get_pinned_giveaways(html))
+
+        # The same giveaway is found in many types (e.g.: wishlist and main)
+        for giveaway in giveaways:
+            code = get_giveaway_code(giveaway)
+
+            if code in entered or code in candidates:
+                continue
+
+            if giveaway.find('div', class_='is-faded'):
+                faded_codes.append(code)
+                continue
+
+            candidates[code] = giveaway
+
+    add_entered_giveaways(faded_codes)
+    stlib.logger.verbose('Found %d new giveaways', len(candidates))
+
+    return last_html, list(candidates.values())
+
+
+def plan_giveaways(giveaways, user_points):
+    if not user_points:
+        return []
+
+    items = []
+
+    for giveaway in giveaways:
+        if giveaway.find('div', class_='is-faded'):
+            continue
+
+        giveaway_points = get_giveaway_points(giveaway)
+
+        if giveaway_points <= user_points:
+            items.append((giveaway, giveaway_points, get_giveaway_value(giveaway)))
+
+    # 0/1 knapsack over the points: best[budget] is the best value reachable
+    # with the items seen so far, and taken[i] records where item i improved it
+    best = [0.0] * (user_points + 1)
+    taken = []
+
+    for giveaway, giveaway_points, value in items:
+        improved = bytearray(user_points + 1)
+
+        for budget in range(user_points, giveaway_points - 1, -1):
+            if best[budget - giveaway_points] + value > best[budget]:
+                best[budget] = best[budget - giveaway_points] + value
+                improved[budget] = 1
+
+        taken.append(improved)
+
+    selected = []
+    budget = user_points
+
+    for (giveaway, giveaway_points, value), improved in zip(reversed(items), reversed(taken)):
+        if improved[budget]:
+            selected.append((value, giveaway))
+            budget -= giveaway_points
+
+    stlib.logger.verbose('Selected %d of %d giveaways', len(selected), len(items))
+
+    return [giveaway for value, giveaway in sorted(selected, key=lambda item: item[0], reverse=True)]
+
+
+def get_entry_limiter():
+    global entry_limiter
+
+    if not entry_limiter:
+        config_parser = stlib.config.read()
+        entries_per_minute = config_parser.getfloat('SteamGifts', 'maxEntriesPerMinute', fallback=6)
+        entry_burst = config_parser.getint('SteamGifts', 'entryBurst', fallback=2)
+        entry_limiter = stlib.network.TokenBucket(entries_per_minute / 60, entry_burst)
+
+    return entry_limiter
+
+
+def get_giveaway_form(giveaway):
+    query_url = stlib.steamgifts_url + get_giveaway_query(giveaway)
+    html = stlib.network.try_get_html('steamgifts', query_url, page_type='giveaway')
+
+    try:
+        form = html.find('div', class_='sidebar').find('form')
+        data = dict([(inputs['name'], inputs['value']) for inputs in form.findAll('input')])
+
+        return {'xsrf_token': data['xsrf_token'],
+                'do': 'entry_insert',
+                'code': data['code']}
+    except (KeyError, AttributeError, TypeError):
+        return None
+
+
+def get_giveaway_forms(giveaways):
+    prefetch = stlib.config.getint('SteamGifts', 'prefetchGiveaways', fallback=4)
+
+    def candidates():
+        for giveaway in giveaways:
+            if giveaway.find('div', class_='is-faded'):
+                stlib.logger.verbose('Ignoring %s because you already joined.', get_giveaway_name(giveaway))
+                continue
+
+            yield giveaway
+
+    def fetch(giveaway):
+        return giveaway, get_giveaway_form(giveaway)
+
+    # The next giveaways pages are fetched while the current one is waiting
+    return stlib.network.map_async(fetch, candidates(), prefetch)
+
+
+@stlib.network.async_wait
+def enter_giveaway(giveaway, post_data):
     giveaway_points = get_giveaway_points(giveaway)
     giveaway_name = get_giveaway_name(giveaway)
     giveaway_copies = get_giveaway_copies(giveaway)
-    query_url = 'https://steamgifts.com' + get_giveaway_query(giveaway)
-    html = stlib.network.try_get_html('steamgifts', query_url)
-    sidebar = html.find('div', class_='sidebar')
-    form = sidebar.find('form')
-    points_spent = 0
+
+    if not post_data:
+        stlib.logger.error('%s has expired. Ignoring.', giveaway_name)
+        return 0
+
+    get_entry_limiter().take()
+    response = stlib.network.try_get_response('steamgifts',
+                                              '{}/ajax.php'.format(stlib.steamgifts_url),
+                                              data=post_data)
 
     try:
-        data = dict([(inputs['name'], inputs['value']) for inputs in form.findAll('input')])
+        result = response.json()
+    except (AttributeError, ValueError):
+        result = {}
 
-        post_data = {'xsrf_token': data['xsrf_token'],
-                     'do': 'entry_insert',
-                     'code': data['code']}
-    except (KeyError, AttributeError):
-        stlib.logger.error('%s has expired. Ignoring.', giveaway_name)
-        return points_spent
+    stlib.metrics.inc('giveaway_entries_total', result=result.get('type', 'error'))
+    stlib.metrics.event('giveaway_entry',
+                        code=post_data['code'],
+                        points=giveaway_points,
+                        result=result.get('type', 'error'))
+
+    if result.get('type') != 'success':
+        stlib.logger.error('Unable to join %s: %s', giveaway_name, result.get('msg', 'no response'))
+        invalidate_points()
+        return 0
 
-    stlib.network.try_get_response('steamgifts', 'https://www.steamgifts.com/ajax.php', data=post_data)
-    points_spent = giveaway_points
+    debit_points(giveaway_points)
+    add_entered_giveaways([post_data['code']])
+
+    try:
+        server_points = int(''.join(filter(str.isdigit, result['points'])))
+    except (KeyError, TypeError, ValueError):
+        server_points = None
+
+    if server_points is not None and server_points != user_points:
+        stlib.logger.verbose('Points drifted (%s locally, %d on server)', user_points, server_points)
+        set_points(server_points)
 
     stlib.logger.info('Spent %d points in the giveaway of %s (Copies: %d)',
                       giveaway_points,
                       giveaway_name,
                       giveaway_copies)
 
-    return points_spent
+    return giveaway_points
+
+
+def join(giveaway):
+    return enter_giveaway(giveaway, get_giveaway_form(giveaway))
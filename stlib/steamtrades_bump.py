@@ -16,13 +16,15 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #
 
+import heapq
 import os
-
-import bs4
+import random
+import time
 
 import stlib
 
-current_trade = 0
+# Heap of (next bump time, trade id)
+bump_queue = []
 
 
 def get_trade_page(trade_id):
@@ -49,18 +51,30 @@ def get_trade_title(response):
 def bump(response):
     trade_id = get_trade_id(response)
     trade_title = get_trade_title(response)
-    html = bs4.BeautifulSoup(response.content, 'html.parser')
+    html = stlib.extractor.parse(response.content, 'trade')
     form = html.find('form')
     data = dict([(inputs['name'], inputs['value']) for inputs in form.findAll('input')])
     post_data = {'code': data['code'], 'xsrf_token': data['xsrf_token'], 'do': 'trade_bump'}
 
     post_response = stlib.network.try_get_response('steamtrades',
-                                                   'https://www.steamtrades.com/ajax.php',
+                                                   '{}/ajax.php'.format(stlib.steamtrades_url),
                                                    data=post_data)
 
-    if 'Please wait another' in post_response.content.decode('utf-8'):
-        post_html = bs4.BeautifulSoup(post_response.content, 'html.parser')
-        error = post_response.json()['popup_heading_h2'][0]
+    try:
+        result = post_response.json()
+    except (AttributeError, ValueError):
+        result = {}
+
+    if result.get('type') == 'success':
+        stlib.logger.info('%s (%s) Bumped!', trade_id, trade_title)
+        return True
+
+    try:
+        error = result['popup_heading_h2'][0]
+    except (KeyError, IndexError):
+        error = ''
+
+    if 'Please wait another' in error:
         minutes_left = int(error.split(' ')[3])
         stlib.logger.warning('%s (%s) Already bumped. Waiting more %d minutes',
                              trade_id,
@@ -68,11 +82,76 @@ def bump(response):
                              minutes_left)
         return minutes_left
     else:
-        response = stlib.network.try_get_response('steamtrades', stlib.steamtrades_trade_page[:-1] + 's')
+        stlib.logger.critical('Something is wrong with %s (%s)', trade_id, trade_title)
+        return False
+
+
+def verify_bumps(trade_ids):
+    # One listing fetch checks all trades bumped in this cycle
+    response = stlib.network.try_get_response('steamtrades', stlib.steamtrades_trade_page[:-1] + 's')
+
+    if not response:
+        stlib.logger.error('Unable to verify the bumped trades')
+        return None
+
+    content = response.content.decode('utf-8')
+
+    for trade_id in trade_ids:
+        if trade_id not in content:
+            stlib.logger.critical('%s was bumped but is not listed in the trades page', trade_id)
+
+
+def schedule_trade(trade_id, delay=0):
+    heapq.heappush(bump_queue, (time.time() + delay, trade_id))
+
+
+def schedule_trades(trade_ids):
+    del bump_queue[:]
 
-        if trade_id in response.content.decode('utf-8'):
-            stlib.logger.info('%s (%s) Bumped!', trade_id, trade_title)
-            return True
+    for trade_id in trade_ids:
+        schedule_trade(trade_id)
+
+
+def get_next_delay():
+    if not bump_queue:
+        return None
+
+    return max(0, bump_queue[0][0] - time.time())
+
+
+def bump_due_trades(MIN_wait_time, MAX_wait_time):
+    bumped_trades = []
+
+    while bump_queue and bump_queue[0][0] <= time.time():
+        bump_time, trade_id = heapq.heappop(bump_queue)
+        current_datetime = time.strftime('%B, %d, %Y - %H:%M:%S')
+        stlib.logger.info('Bumping %s now! %s', trade_id, current_datetime)
+
+        response = get_trade_page(trade_id)
+
+        if not response:
+            # Invalid trades are never scheduled again
+            stlib.metrics.inc('trade_bumps_total', result='invalid')
+            stlib.metrics.event('trade_bump', trade_id=trade_id, result='invalid')
+            continue
+
+        return_ = bump(response)
+
+        if type(return_) == int:
+            result = 'waiting'
+            delay = return_ * 60 + random.randint(0, MAX_wait_time - MIN_wait_time)
         else:
-            stlib.logger.critical('Something is wrong with %s (%s)', trade_id, trade_title)
-            return False
+            result = 'bumped' if return_ else 'failed'
+            delay = random.randint(MIN_wait_time, MAX_wait_time)
+
+            if return_:
+                bumped_trades.append(trade_id)
+
+        stlib.metrics.inc('trade_bumps_total', result=result)
+        stlib.metrics.event('trade_bump', trade_id=trade_id, result=result, next_bump=delay)
+        schedule_trade(trade_id, delay)
+
+    if bumped_trades and stlib.config.getboolean('SteamTrades', 'verifyBumps', fallback=False):
+        verify_bumps(bumped_trades)
+
+    return bumped_trades
@@ -1,18 +1,18 @@
-import sys
-
 import gevent
+import greenlet
 
+import stlib
 from stlib import gui_mode
 from ui import console, version
 
 __all__ = ['console', 'version']
 
-if len(sys.argv) == 1:
+if gui_mode:
     import gi
 
     gi.require_version('Gtk', '3.0')
 
-    from gi.repository import Gtk
+    from gi.repository import Gtk, GLib
 
     from ui import (main,
                     signals,
@@ -22,11 +22,25 @@ if len(sys.argv) == 1:
                     'signals',
                     'timers'])
 
-def update_main_loop():
-    gevent.sleep(0.001)
+def is_main_greenlet():
+    return greenlet.getcurrent().parent is None
+
 
+def wakeup_main_loop():
     if gui_mode:
-        Gtk.main_iteration()
+        GLib.MainContext.default().wakeup()
+
+
+def wait_main_loop(condition):
+    while not condition():
+        # Sleeps until gtk has events or a worker calls wakeup_main_loop
+        Gtk.main_iteration_do(True)
+        # Let the greenlets waiting on finished workers run. The hub
+        # delivers their results, which may take more than one loop
+        gevent.idle()
+
+        while stlib.network.has_undelivered_results():
+            gevent.idle()
 
 main_window = None
 application = None
@@ -34,10 +48,12 @@ selected_profile_id = 0
 
 card_farming_is_running = False
 card_farming_game_start_time = None
+card_farming_timer_id = None
 fake_app_is_running = False
 fake_app_id = None
 steamtrades_bump_is_running = False
 steamtrades_bump_waiting = False
+steamtrades_bump_timer_id = None
 steamgifts_join_is_running = False
 steamgifts_join_waiting = False
 steamgifts_join_giveaway_waiting = False
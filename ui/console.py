@@ -17,7 +17,6 @@
 #
 
 import configparser
-import itertools
 import random
 import sys
 import time
@@ -85,10 +84,7 @@ class SteamTools:
 
         if stlib.libsteam.is_steam_running():
             stlib.logger.info('Preparing. Please wait...')
-            badge_pages = stlib.card_farming.get_badge_page_count()
-            badges = []
-            for page in range(1, badge_pages + 1):
-                badges.extend(stlib.card_farming.get_badges(page))
+            badges = stlib.card_farming.get_all_badges()
 
             badges = stlib.card_farming.remove_completed_badges(badges)
             cards_info = stlib.card_farming.get_cards_info()
@@ -98,37 +94,41 @@ class SteamTools:
 
             stlib.logger.warning('Ready to start.')
 
-            for badge in badges:
-                game_name = stlib.card_farming.get_game_name(badge)
-                game_id = stlib.card_farming.get_game_id(badge)
-                stlib.logger.info('Starting game %s (%s)', game_name, game_id)
-                stlib.libsteam.run_wrapper(game_id)
+            max_games = self.config_parser.getint('CardFarming', 'maxConcurrentGames', fallback=1)
 
-                while True:
-                    card_count = stlib.card_farming.get_card_count(badge, False)
-                    stlib.logging.console_msg('{:2d} cards drop remaining. Waiting...'.format(card_count), end='\r')
-                    stlib.logger.verbose('Waiting card drop loop')
-
-                    for i in range(40):
-                        if stlib.wrapper_process.poll():
-                            stlib.logging.console_fixer()
-                            stlib.logger.critical(stlib.wrapper_process.stderr.read().decode('utf-8'))
-                            sys.exit(1)
-
-                        try:
-                            time.sleep(1)
-                        except KeyboardInterrupt:
-                            sys.exit(0)
-
-                    stlib.logging.console_msg('Checking if game have more cards drops...', end='\r')
-                    card_count = stlib.card_farming.get_card_count(badge, True)
-
-                    if card_count is 0:
-                        stlib.logging.console_fixer('\r')
-                        stlib.logger.warning('No more cards to drop.')
-                        stlib.logger.info('Closing %s', game_name)
-                        stlib.libsteam.stop_wrapper()
-                        break
+            while True:
+                for badge in stlib.card_farming.start_next_badges(badges, max_games):
+                    game_name = stlib.card_farming.get_game_name(badge)
+                    game_id = stlib.card_farming.get_game_id(badge)
+                    stlib.logger.info('Starting game %s (%s)', game_name, game_id)
+
+                running_badges = stlib.card_farming.running_badges
+
+                if not running_badges:
+                    break
+
+                card_count = sum(stlib.card_farming.get_card_count(badge, False) for badge in running_badges)
+                stlib.logging.console_msg('{:2d} cards drop remaining. Waiting...'.format(card_count), end='\r')
+                stlib.logger.verbose('Waiting card drop loop')
+
+                for i in range(stlib.card_farming.get_next_poll_delay()):
+                    for game_id in stlib.libsteam.get_failed_wrappers():
+                        stlib.logging.console_fixer()
+                        process = stlib.wrapper_processes[game_id]
+                        stlib.logger.critical(process.stderr.read().decode('utf-8'))
+                        sys.exit(1)
+
+                    try:
+                        time.sleep(1)
+                    except KeyboardInterrupt:
+                        sys.exit(0)
+
+                stlib.logging.console_msg('Checking if games have more cards drops...', end='\r')
+
+                for badge in stlib.card_farming.update_running_badges():
+                    stlib.logging.console_fixer('\r')
+                    stlib.logger.warning('No more cards to drop.')
+                    stlib.logger.info('Closing %s', stlib.card_farming.get_game_name(badge))
         else:
             stlib.logger.error('Unable to locate a running instance of steam.')
             stlib.logger.error('Please, start the Steam Client and try again.')
@@ -184,32 +184,27 @@ class SteamTools:
             stlib.logger.error('Please, edit the auto-generated config file after this run')
             stlib.logger.error(stlib.config.config_file_path)
 
-        while True:
-            MIN_wait_time = self.config_parser.getint('SteamTrades', 'minWaitTime', fallback=3700)
-            MAX_wait_time = self.config_parser.getint('SteamTrades', 'maxWaitTime', fallback=4100)
-            current_datetime = time.strftime('%B, %d, %Y - %H:%M:%S')
-
-            stlib.logging.console_fixer('\r')
-            stlib.logger.info('Bumping now! %s', current_datetime)
-
-            for trade_id in trade_ids:
-                response = stlib.steamtrades_bump.get_trade_page(trade_id)
+        MIN_wait_time = self.config_parser.getint('SteamTrades', 'minWaitTime', fallback=3700)
+        MAX_wait_time = self.config_parser.getint('SteamTrades', 'maxWaitTime', fallback=4100)
 
-                if not response:
-                    continue
+        stlib.steamtrades_bump.schedule_trades(trade_ids)
 
-                return_ = stlib.steamtrades_bump.bump(response)
+        while True:
+            stlib.logging.console_fixer('\r')
+            stlib.steamtrades_bump.bump_due_trades(MIN_wait_time, MAX_wait_time)
+            delay = stlib.steamtrades_bump.get_next_delay()
 
-                if type(return_) == int:
-                    MIN_wait_time = return_ * 60
-                    MAX_wait_time = MIN_wait_time + 400
+            if delay is None:
+                break
 
-            random_time = random.randint(MIN_wait_time, MAX_wait_time)
+            wait_time = int(delay) + 1
 
-            for past_time in range(random_time):
-                stlib.logging.console_msg("Waiting: {:4d} seconds".format(random_time - past_time), end='\r')
+            for past_time in range(wait_time):
+                stlib.logging.console_msg("Waiting: {:4d} seconds".format(wait_time - past_time), end='\r')
                 time.sleep(1)
 
+        stlib.logger.warning('There\'s nothing else to do. Leaving.')
+
     def __steamgifts_join(self):
         stlib.logins.queue_connect('steamgifts', wait=True)
 
@@ -232,50 +227,33 @@ class SteamTools:
 
         stlib.steamgifts_join.configure()
 
-        for type in type_list:
-            query_url = '{}?type='.format(stlib.steamgifts_query_page)
-
-            if type == 'wishlist':
-                query_url += 'wishlist'
-            elif type == 'new':
-                query_url += 'new'
-            elif type == 'main':
-                pass
-            else:
-                query_url += '&q={}'.format(type)
-
-            html = stlib.network.try_get_html('steamgifts', query_url)
+        developer_giveaways = self.config_parser.getboolean('SteamGifts', 'developerGiveaways', fallback=True)
+        html, giveaways = stlib.steamgifts_join.get_candidates(type_list, developer_giveaways)
+        user_points = stlib.steamgifts_join.seed_points(html) if html else stlib.steamgifts_join.get_points()
 
-            user_points = stlib.steamgifts_join.get_user_points(html)
-            giveaway_generator = stlib.steamgifts_join.get_giveaways(html)
+        for giveaway, post_data in stlib.steamgifts_join.get_giveaway_forms(
+                stlib.steamgifts_join.plan_giveaways(giveaways, user_points)):
+            giveaway_points = stlib.steamgifts_join.get_giveaway_points(giveaway)
 
-            if self.config_parser.getboolean('SteamGifts', 'developerGiveaways', fallback=True):
-                pinned_generator = stlib.steamgifts_join.get_pinned_giveaways(html)
-                giveaway_generator = itertools.chain(giveaway_generator, pinned_generator)
+            if user_points < giveaway_points:
+                stlib.logger.verbose('Ignoring %s', stlib.steamgifts_join.get_giveaway_name(giveaway))
+                stlib.logger.verbose('because the account don\'t have the requirements to enter.')
+                continue
 
-            for giveaway in giveaway_generator:
-                giveaway_points = stlib.steamgifts_join.get_giveaway_points(giveaway)
+            stlib.steamgifts_join.enter_giveaway(giveaway, post_data)
+            user_points = stlib.steamgifts_join.get_points()
 
-                if giveaway.find('div', class_='is-faded'):
-                    continue
-
-                if user_points == 0:
-                    break
+            # Synced again in the next round
+            if user_points is None:
+                break
 
-                if user_points >= giveaway_points:
-                    points_spent = stlib.steamgifts_join.join(giveaway)
-                    user_points -= points_spent
-
-                    antiban_time = random.randint(1, 15)
-                    for past_time in range(antiban_time):
-                        stlib.logging.console_msg(
-                                '[ANTI-BAN TIMER] Waiting {:2d} seconds'.format(antiban_time - past_time),
-                                end='\r'
-                        )
-                        time.sleep(1)
-                else:
-                    stlib.logger.verbose('Ignoring %s', stlib.steamgifts_join.get_giveaway_name(giveaway))
-                    stlib.logger.verbose('because the account don\'t have the requirements to enter.')
+            antiban_time = random.randint(1, 15)
+            for past_time in range(antiban_time):
+                stlib.logging.console_msg(
+                        '[ANTI-BAN TIMER] Waiting {:2d} seconds'.format(antiban_time - past_time),
+                        end='\r'
+                )
+                time.sleep(1)
 
         MIN_wait_time = self.config_parser.getint('SteamGifts', 'minWaitTime', fallback=7000)
         MAX_wait_time = self.config_parser.getint('SteamGifts', 'maxWaitTime', fallback=7300)
@@ -156,12 +156,12 @@ class SteamTools(Gtk.Application):
             action.connect('activate', eval(''.join(action_handler)))
             self.add_action(action)
 
-    def do_login_check(self):
+    def do_login_check(self, use_cache=True):
         self.window.spinner.start()
 
-        greenlets = [stlib.logins.queue_connect('steam', self.do_steam_login),
-                     stlib.logins.queue_connect('steamgifts', self.do_steamgifts_login),
-                     stlib.logins.queue_connect('steamtrades', self.do_steamtrades_login)]
+        greenlets = [stlib.logins.queue_connect('steam', self.do_steam_login, use_cache=use_cache),
+                     stlib.logins.queue_connect('steamgifts', self.do_steamgifts_login, use_cache=use_cache),
+                     stlib.logins.queue_connect('steamtrades', self.do_steamtrades_login, use_cache=use_cache)]
 
         stlib.logins.wait_queue(greenlets)
 
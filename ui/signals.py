@@ -85,7 +85,8 @@ def on_recheck_logins_activate(action, params):
     icon_path = os.path.join(ui.application.icons_path, ui.application.SC_icon_busy)
     ui.main_window.SC_login_status.set_from_file(icon_path)
 
-    ui.application.do_login_check()
+    # The user asked for it, so don't trust a cached login
+    ui.application.do_login_check(use_cache=False)
 
 
 def on_settings_activate(action, parameters):
@@ -213,10 +214,7 @@ def on_card_farming_start():
         ui.main_window.spinner.start()
         ui.card_farming_is_running = True
 
-        badge_pages = stlib.card_farming.get_badge_page_count()
-        badges = []
-        for page in range(1, badge_pages + 1):
-            badges.extend(stlib.card_farming.get_badges(page))
+        badges = stlib.card_farming.get_all_badges()
 
         badges = stlib.card_farming.remove_completed_badges(badges)
         cards_info = stlib.card_farming.get_cards_info()
@@ -234,8 +232,8 @@ def on_card_farming_start():
         ui.main_window.card_farming_total_card_left.set_text('Counting...')
         GLib.idle_add(ui.timers.total_card_count, badges)
 
+        ui.timers.cancel_card_farming_timer()
         ui.timers.card_farming_timer(dry_run, badges)
-        GLib.timeout_add_seconds(40, ui.timers.card_farming_timer, dry_run, badges)
 
         ui.main_window.stop.set_sensitive(True)
     else:
@@ -254,7 +252,8 @@ def on_card_farming_stop():
 
     ui.application.update_status_bar("Waiting to card farming terminate.")
     ui.card_farming_is_running = False
-    stlib.card_farming.current_badge = 0
+    ui.timers.cancel_card_farming_timer()
+    stlib.card_farming.reset_running_badges()
     stlib.libsteam.stop_wrapper()
     ui.fake_app_is_running = False
     ui.fake_app_id = None
@@ -359,10 +358,12 @@ def on_steamtrades_bump_start():
     ui.application.update_status_bar('Ready.')
     ui.main_window.spinner.stop()
 
-    GLib.timeout_add_seconds(
+    ui.timers.cancel_steamtrades_bump_timer()
+    stlib.steamtrades_bump.schedule_trades(trade_ids)
+
+    ui.steamtrades_bump_timer_id = GLib.timeout_add_seconds(
             1,
             ui.timers.steamtrades_bump_timer,
-            trade_ids,
             MIN_wait_time,
             MAX_wait_time
     )
@@ -375,7 +376,8 @@ def on_steamtrades_bump_stop():
     ui.main_window.start.set_sensitive(True)
     ui.main_window.stop.set_sensitive(False)
     ui.main_window.ST_bump_progress_bar.set_fraction(0)
-    stlib.steamtrades_bump.current_trade = 0
+    ui.timers.cancel_steamtrades_bump_timer()
+    del stlib.steamtrades_bump.bump_queue[:]
 
 
 def on_steamgifts_join_start():
@@ -407,6 +409,7 @@ def on_steamgifts_join_start():
 
 def on_steamgifts_join_stop():
     ui.steamgifts_join_is_running = False
+    stlib.steamgifts_join.giveaway_plan = None
     ui.main_window.start.set_sensitive(True)
     ui.main_window.stop.set_sensitive(False)
     ui.main_window.SG_join_progress_bar.set_fraction(0)
@@ -17,7 +17,6 @@
 #
 
 import datetime
-import itertools
 import random
 import time
 
@@ -41,6 +40,7 @@ def hide_info_label():
     return False
 
 
+@stlib.profiler.timed('timers.card_farming_time_timer')
 def card_farming_time_timer(start_time):
     if not ui.card_farming_is_running:
         return False
@@ -58,6 +58,7 @@ def card_farming_time_timer(start_time):
     return True
 
 
+@stlib.profiler.timed('timers.total_card_count')
 def total_card_count(badges):
     generator = stlib.card_farming.get_total_card_count(badges)
     for card_count in generator:
@@ -67,43 +68,66 @@ def total_card_count(badges):
     return False
 
 
+@stlib.profiler.timed('timers.card_farming_timer')
 def card_farming_timer(dry_run, badges):
+    # Running now, so there is nothing left to cancel
+    ui.card_farming_timer_id = None
+
     if not ui.card_farming_is_running:
         return False
 
-    badge = badges[stlib.card_farming.current_badge]
+    config_parser = stlib.config.read()
+    max_games = config_parser.getint('CardFarming', 'maxConcurrentGames', fallback=1)
+
+    # Update card drops of the running games. Games without
+    # more cards are closed and replaced by the next badges
+    if stlib.card_farming.running_badges:
+        for badge in stlib.card_farming.update_running_badges(dry_run):
+            stlib.logger.info('No more cards to drop for %s', stlib.card_farming.get_game_name(badge))
 
-    # Update card drop
-    # If the current game have more cards, return and wait the new loop
-    # otherwise, close, go to next badge, and start new game (see bellow)
-    if ui.fake_app_id:
-        card_count = stlib.card_farming.get_card_count(badge, True)
+    started_badges = stlib.card_farming.start_next_badges(badges, max_games, dry_run)
 
-        if card_count is 0:
-            if not dry_run:
-                stlib.libsteam.stop_wrapper()
-                ui.card_farming_is_running = False
+    if not stlib.card_farming.running_badges:
+        stlib.logger.warning('There\'s nothing else to do. Stopping.')
+        ui.signals.on_card_farming_stop()
+        return False
 
-            stlib.card_farming.current_badge += 1
-        else:
-            return True
+    # Only one timer runs at time. The next one is scheduled when drops are expected
+    ui.card_farming_timer_id = GLib.timeout_add_seconds(stlib.card_farming.get_next_poll_delay(),
+                                                        card_farming_timer,
+                                                        dry_run,
+                                                        badges)
 
-    # Start new game because the last check don't found more cards or a fake id
-    if not dry_run:
-        stlib.logger.info('Preparing. Please wait...')
-        ui.fake_app_id = stlib.card_farming.get_game_id(badge)
+    if dry_run:
+        return False
 
-        ui.main_window.card_farming_current_game.set_text(stlib.card_farming.get_game_name(badge))
-        ui.main_window.card_farming_card_left.set_text('{} cards'.format(stlib.card_farming.get_card_count(badge)))
+    running_badges = stlib.card_farming.running_badges
+    ui.fake_app_id = ', '.join(stlib.card_farming.get_game_id(badge) for badge in running_badges)
+    game_names = ', '.join(stlib.card_farming.get_game_name(badge) for badge in running_badges)
+    card_count = sum(stlib.card_farming.get_card_count(badge) for badge in running_badges)
 
+    ui.main_window.card_farming_current_game.set_text(game_names)
+    ui.main_window.card_farming_card_left.set_text('{} cards'.format(card_count))
+
+    for badge in started_badges:
+        stlib.logger.info('Running {}'.format(stlib.card_farming.get_game_id(badge)))
         ui.card_farming_game_start_time = time.time()
-        stlib.libsteam.run_wrapper(ui.fake_app_id)
+
+    if started_badges and not ui.fake_app_is_running:
         ui.fake_app_is_running = True
-        stlib.logger.info('Running {}'.format(ui.fake_app_id))
         GLib.timeout_add_seconds(1, fake_app_timer, ui.card_farming_game_start_time)
-    return True
+
+    return False
 
 
+def cancel_card_farming_timer():
+    # Two timers would poll the same running badges
+    if ui.card_farming_timer_id is not None:
+        GLib.source_remove(ui.card_farming_timer_id)
+        ui.card_farming_timer_id = None
+
+
+@stlib.profiler.timed('timers.fake_app_timer')
 def fake_app_timer(start_time):
     if not ui.fake_app_is_running:
         return False
@@ -111,14 +135,20 @@ def fake_app_timer(start_time):
     elapsed_seconds = round(time.time() - start_time)
     elapsed_time = datetime.timedelta(seconds=elapsed_seconds)
 
-    if not stlib.libsteam.is_wrapper_running():
-        ui.application.update_status_bar("This is not a valid gameID.")
+    failed_wrappers = stlib.libsteam.get_failed_wrappers()
+
+    for app_id in failed_wrappers:
+        # Closed here, so each failed game is reported only once
+        stlib.libsteam.stop_wrapper(app_id)
+
+        ui.application.update_status_bar("{} is not a valid gameID.".format(app_id))
         message = ui.main.MessageDialog(Gtk.MessageType.ERROR,
                                         'Fake Steam App',
-                                        'This is not a valid gameID.',
+                                        '{} is not a valid gameID.'.format(app_id),
                                         "Please, check if you write correctly and try again.")
         message.show()
 
+    if not any(stlib.libsteam.is_wrapper_running(app_id) for app_id in stlib.wrapper_processes):
         ui.fake_app_is_running = False
         ui.main_window.start.set_sensitive(True)
         ui.main_window.stop.set_sensitive(False)
@@ -150,37 +180,24 @@ def progress_bar_pulse(type_, progress_bar, start_time, maximum_time):
         return True
 
 
-def steamtrades_bump_timer(trade_ids, MIN_wait_time, MAX_wait_time):
+@stlib.profiler.timed('timers.steamtrades_bump_timer')
+def steamtrades_bump_timer(MIN_wait_time, MAX_wait_time):
+    # Running now, so there is nothing left to cancel
+    ui.steamtrades_bump_timer_id = None
+
     if not ui.steamtrades_bump_is_running:
         return False
 
-    if ui.steamtrades_bump_waiting:
-        return True
+    stlib.steamtrades_bump.bump_due_trades(MIN_wait_time, MAX_wait_time)
+    delay = stlib.steamtrades_bump.get_next_delay()
 
-    try:
-        trade_id = trade_ids[stlib.steamtrades_bump.current_trade]
-    except IndexError:
+    if delay is None:
         stlib.logger.warning('There\'s nothing else to do. Stopping.')
         ui.signals.on_steamtrades_bump_stop()
         return False
 
-    current_datetime = time.strftime('%B, %d, %Y - %H:%M:%S')
-    stlib.logger.info('Bumping now! %s', current_datetime)
-
-    response = stlib.steamtrades_bump.get_trade_page(trade_id)
-
-    if not response:
-        stlib.steamtrades_bump.current_trade += 1
-        return True
-
-    return_ = stlib.steamtrades_bump.bump(response)
-
-    if type(return_) == int:
-        MIN_wait_time = return_ * 60
-        MAX_wait_time = MIN_wait_time + 400
-
-    random_time = random.randint(MIN_wait_time, MAX_wait_time)
-
+    # Sleep until the next trade can be bumped
+    delay = max(1, int(delay) + 1)
     start_time = time.time()
 
     GLib.timeout_add_seconds(1,
@@ -188,22 +205,24 @@ def steamtrades_bump_timer(trade_ids, MIN_wait_time, MAX_wait_time):
                              'steamtrades_bump',
                              ui.main_window.ST_bump_progress_bar,
                              start_time,
-                             random_time)
+                             delay)
 
-    ui.steamtrades_bump_waiting = True
+    ui.steamtrades_bump_timer_id = GLib.timeout_add_seconds(delay,
+                                                            steamtrades_bump_timer,
+                                                            MIN_wait_time,
+                                                            MAX_wait_time)
 
-    return True
+    return False
 
 
-def steamgifts_join_update_points():
-    if not ui.steamgifts_join_is_running or \
-            not ui.steamgifts_join_waiting:
-        return False
-
-    user_points = stlib.steamgifts_join.get_user_points()
-    ui.main_window.SG_join_current_points.set_text('{} points'.format(str(user_points)))
+def cancel_steamtrades_bump_timer():
+    # Two timers would pop the same queue
+    if ui.steamtrades_bump_timer_id is not None:
+        GLib.source_remove(ui.steamtrades_bump_timer_id)
+        ui.steamtrades_bump_timer_id = None
 
 
+@stlib.profiler.timed('timers.steamgifts_join_giveaway_timer')
 def steamgifts_join_giveaway_timer(giveaway):
     if not ui.steamgifts_join_is_running:
         return False
@@ -212,21 +231,21 @@ def steamgifts_join_giveaway_timer(giveaway):
         return True
 
     try:
-        giveaway = next(giveaway)
+        giveaway, post_data = next(giveaway)
     except StopIteration:
-        # FIXME
-        stlib.logger.verbose('There\'s nothing else for type **TYPE**')
+        stlib.logger.verbose('There\'s nothing else to join')
         ui.steamgifts_join_waiting = False
         return False
 
     giveaway_points = stlib.steamgifts_join.get_giveaway_points(giveaway)
     giveaway_name = stlib.steamgifts_join.get_giveaway_name(giveaway)
 
-    if giveaway.find('div', class_='is-faded'):
-        stlib.logger.verbose('Ignoring %s because you already joined.', giveaway_name)
-        return True
+    user_points = stlib.steamgifts_join.get_points()
+
+    if user_points is None:
+        ui.steamgifts_join_waiting = False
+        return False
 
-    user_points = stlib.steamgifts_join.get_user_points()
     ui.main_window.SG_join_current_points.set_text('{} points'.format(str(user_points)))
 
     if user_points == 0:
@@ -235,10 +254,13 @@ def steamgifts_join_giveaway_timer(giveaway):
         return False
 
     if user_points >= giveaway_points:
-        points_spent = stlib.steamgifts_join.join(giveaway)
+        points_spent = stlib.steamgifts_join.enter_giveaway(giveaway, post_data)
 
         ui.main_window.SG_join_last_giveaway.set_text('{} ({}P)'.format(giveaway_name, points_spent))
-        ui.main_window.SG_join_current_points.set_text('{} points'.format(user_points - points_spent))
+        user_points = stlib.steamgifts_join.get_points()
+
+        if user_points is not None:
+            ui.main_window.SG_join_current_points.set_text('{} points'.format(user_points))
 
         antiban_time = random.randint(1, 15)
         start_time = time.time()
@@ -258,6 +280,7 @@ def steamgifts_join_giveaway_timer(giveaway):
     return True
 
 
+@stlib.profiler.timed('timers.steamgifts_join_timer')
 def steamgifts_join_timer(MIN_wait_time, MAX_wait_time):
     if not ui.steamgifts_join_is_running:
         return False
@@ -265,16 +288,9 @@ def steamgifts_join_timer(MIN_wait_time, MAX_wait_time):
     if ui.steamgifts_join_waiting:
         return True
 
-    config_parser = stlib.config.read()
-    type_list = config_parser.get('SteamGifts', 'typeList')
-
-    try:
-        if stlib.steamgifts_join.giveaway_type is None:
-            stlib.steamgifts_join.giveaway_type = stlib.steamgifts_join.type_generator(type_list)
-
-        giveaway_type = next(stlib.steamgifts_join.giveaway_type)
-    except StopIteration:
-        stlib.steamgifts_join.giveaway_type = None
+    # The plan made in the last round was already joined
+    if stlib.steamgifts_join.giveaway_plan is not None:
+        stlib.steamgifts_join.giveaway_plan = None
         random_time = random.randint(MIN_wait_time, MAX_wait_time)
 
         start_time = time.time()
@@ -286,35 +302,27 @@ def steamgifts_join_timer(MIN_wait_time, MAX_wait_time):
                                  start_time,
                                  random_time)
 
-        GLib.timeout_add_seconds(60 * 5, steamgifts_join_update_points)
-
         ui.steamgifts_join_waiting = True
 
         return True
 
     ui.application.update_status_bar('Gathering...')
 
-    query_url = '{}?type='.format(stlib.steamgifts_query_page)
+    config_parser = stlib.config.read()
+    type_list = stlib.steamgifts_join.type_generator(config_parser.get('SteamGifts', 'typeList'))
+    developer_giveaways = config_parser.getboolean('SteamGifts', 'developerGiveaways', fallback=True)
 
-    if giveaway_type == 'wishlist':
-        query_url += 'wishlist'
-    elif giveaway_type == 'new':
-        query_url += 'new'
-    elif giveaway_type == 'main':
-        pass
-    else:
-        query_url += '&q={}'.format(giveaway_type)
+    html, giveaways = stlib.steamgifts_join.get_candidates(type_list, developer_giveaways)
+    user_points = stlib.steamgifts_join.seed_points(html) if html else stlib.steamgifts_join.get_points()
 
-    html = stlib.network.try_get_html('steamgifts', query_url)
-    giveaway_generator = stlib.steamgifts_join.get_giveaways(html)
+    if user_points is not None:
+        ui.main_window.SG_join_current_points.set_text('{} points'.format(str(user_points)))
 
-    if config_parser.getboolean('SteamGifts', 'developerGiveaways', fallback=True):
-        pinned_generator = stlib.steamgifts_join.get_pinned_giveaways(html)
-        giveaway_generator = itertools.chain(giveaway_generator, pinned_generator)
+    stlib.steamgifts_join.giveaway_plan = stlib.steamgifts_join.plan_giveaways(giveaways, user_points)
 
     GLib.timeout_add(50,
                      steamgifts_join_giveaway_timer,
-                     giveaway_generator)
+                     stlib.steamgifts_join.get_giveaway_forms(stlib.steamgifts_join.giveaway_plan))
 
     ui.steamgifts_join_waiting = True
 